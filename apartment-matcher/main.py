@@ -1,4 +1,5 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -6,8 +7,9 @@ from models import SearchCriteria, MatchResult, PropertyListing
 from scrapers.flatfox_scraper import FlatfoxScraper
 from scrapers.homegate_scraper import HomegateScraper
 from scrapers.immoscout_scraper import ImmoscoutScraper
+from scrapers.base_scraper import warm_shared_driver_pool, close_shared_driver_pool
 from matcher import PropertyMatcher
-from database import Database
+from database import AsyncDatabase
 from email_notifier import EmailNotifier
 from typing import List, Optional
 import uvicorn
@@ -34,7 +36,7 @@ app.add_middleware(
 )
 
 # Initialize components
-db = Database()
+db = AsyncDatabase()
 matcher = PropertyMatcher()
 notifier = EmailNotifier()
 scrapers = {
@@ -48,40 +50,39 @@ class SearchProfileCreate(BaseModel):
     criteria: SearchCriteria
     notification_frequency: str = "daily"
 
+class SearchProfileUpdate(BaseModel):
+    criteria: Optional[SearchCriteria] = None
+    notification_frequency: Optional[str] = None
+
 @app.get("/")
 async def read_root(request: Request):
     """Render the main page"""
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.post("/search", response_model=List[MatchResult])
-async def search_apartments(criteria: SearchCriteria, background_tasks: BackgroundTasks):
+async def search_apartments(criteria: SearchCriteria, background_tasks: BackgroundTasks,
+                            top_k: Optional[int] = None, min_score: float = 0.0):
     """
     Search for apartments matching the given criteria across multiple websites
+    Optionally keep only the top_k best matches scoring at least min_score
     """
     all_listings = []
     
-    try:
-        # Run scrapers
-        for scraper_name, scraper in scrapers.items():
-            try:
-                listings = scraper.scrape(criteria.dict())
-                all_listings.extend(listings)
+    # Run scrapers, each on a browser leased from the shared driver pool
+    # Scraping and scoring block, so they run in worker threads and other requests are served meanwhile
+    for scraper_name, scraper in scrapers.items():
+        try:
+            listings = await run_in_threadpool(scraper.scrape, criteria.dict())
+            all_listings.extend(listings)
+            
+            # Save listings to database
+            await db.add_listings(listings)
                 
-                # Save listings to database
-                for listing in listings:
-                    db.add_listing(listing)
-                    
-            except Exception as e:
-                print(f"Error with {scraper_name}: {e}")
-    finally:
-        # Cleanup scrapers
-        background_tasks.add_task(lambda: [scraper.cleanup() for scraper in scrapers.values()])
+        except Exception as e:
+            print(f"Error with {scraper_name}: {e}")
     
-    # Match listings against criteria
-    matches = matcher.match_listings(criteria, all_listings)
-    
-    # Sort by match score
-    matches.sort(key=lambda x: x.match_score, reverse=True)
+    # Match listings against criteria, best matches first
+    matches = await run_in_threadpool(matcher.top_matches, criteria, all_listings, top_k=top_k, min_score=min_score)
     
     return matches
 
@@ -91,41 +92,74 @@ async def create_search_profile(profile: SearchProfileCreate):
     Create a new search profile for email notifications
     """
     try:
-        db.add_search_profile(
+        profile_id = await db.add_search_profile(
             email=profile.email,
             criteria=profile.criteria.dict(),
             frequency=profile.notification_frequency
         )
-        return {"message": "Search profile created successfully"}
+        return {"message": "Search profile created successfully", "id": profile_id}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/profiles/bulk", status_code=201)
+async def create_search_profiles(profiles: List[SearchProfileCreate]):
+    """
+    Create many search profiles in one transaction
+    """
+    try:
+        profile_ids = await db.add_search_profiles([
+            {
+                "email": profile.email,
+                "criteria": profile.criteria.dict(),
+                "frequency": profile.notification_frequency
+            }
+            for profile in profiles
+        ])
+        return {"message": f"{len(profile_ids)} search profiles created successfully", "ids": profile_ids}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/profiles/{email}", response_model=List[dict])
-async def get_search_profiles(email: str):
+async def get_search_profiles(email: str, after_id: Optional[int] = None,
+                              limit: int = Query(50, ge=1, le=500)):
     """
-    Get all search profiles for a given email
+    Get the search profiles for a given email, in id order
+    Pass the id of the last profile received as after_id to get the next page
     """
-    profiles = db.get_search_profiles()
+    profiles = await db.get_profiles_by_email(email, after_id=after_id, limit=limit)
     return [
         {
+            "id": p.id,
             "email": p.user_email,
             "criteria": p.criteria,
             "frequency": p.notification_frequency,
             "last_notification": p.last_notification
         }
-        for p in profiles if p.user_email == email
+        for p in profiles
     ]
 
+@app.patch("/profiles/{profile_id}")
+async def update_search_profile(profile_id: int, update: SearchProfileUpdate):
+    """
+    Update the criteria and/or notification frequency of a search profile
+    """
+    updated = await db.update_profile(
+        profile_id,
+        criteria=update.criteria.dict() if update.criteria else None,
+        frequency=update.notification_frequency
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return {"message": "Profile updated successfully"}
+
 @app.delete("/profiles/{profile_id}")
 async def delete_search_profile(profile_id: int):
     """
     Delete a search profile
     """
-    try:
-        db.delete_profile(profile_id)
-        return {"message": "Profile deleted successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=str(e))
+    if not await db.delete_profile(profile_id):
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return {"message": "Profile deleted successfully"}
 
 @app.get("/healthcheck")
 async def healthcheck():
@@ -134,11 +168,17 @@ async def healthcheck():
     """
     return {"status": "healthy"}
 
+@app.on_event("startup")
+async def startup_event():
+    """Create or upgrade the database schema and start the warm browsers of the driver pool"""
+    await db.initialize()
+    await run_in_threadpool(warm_shared_driver_pool)
+
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     """Cleanup resources on shutdown"""
-    for scraper in scrapers.values():
-        scraper.cleanup()
+    close_shared_driver_pool()
+    await db.close()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -6,6 +6,7 @@ from datetime import datetime
 import os
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
+from sqlite_pragmas import configure_sqlite
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -42,6 +43,11 @@ ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'}
 
 db = SQLAlchemy(app)
 
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Profil SQLite optionnel, voir sqlite_pragmas.SQLITE_PROFILES
+    with app.app_context():
+        configure_sqlite(db.engine, os.getenv('SQLITE_PROFILE', 'default'))
+
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -0,0 +1,127 @@
+"""
+Compare listing ingest and read throughput across the SQLite profiles
+
+    python benchmark_sqlite.py --listings 5000 --readers 4 --seconds 5
+
+Each profile gets a fresh database file. Ingestion is measured with one
+commit per listing and with batched upserts, then reader threads query
+candidates while a writer keeps updating prices, counting the reads that
+failed with "database is locked".
+"""
+from datetime import datetime, timedelta
+from sqlalchemy.exc import OperationalError
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from database import Database
+from locality import SWISS_LOCALITIES
+from sqlite_pragmas import SQLITE_PROFILES
+
+def make_listings(count: int, seed: int = 0) -> list:
+    """Generate random listings spread over the seeded localities"""
+    rng = random.Random(seed)
+    features = ['balcony', 'elevator', 'parking', 'terrace', 'garden', 'furnished']
+    return [
+        {
+            'external_id': f'bench-{number}',
+            'source': rng.choice(['flatfox', 'homegate', 'immoscout']),
+            'title': f'Apartment {number}',
+            'price': float(rng.randrange(800, 5000, 10)),
+            'location': rng.choice(SWISS_LOCALITIES)[0],
+            'rooms': rng.choice([1.5, 2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.5]),
+            'size': float(rng.randrange(25, 180)),
+            'features': rng.sample(features, rng.randint(0, 3)),
+            'images': [],
+            'link': f'https://example.com/listing/{number}'
+        }
+        for number in range(count)
+    ]
+
+def run_profile(profile: str, listings: list, readers: int, seconds: float) -> dict:
+    """Measure ingest and read throughput for one profile on a fresh database"""
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(f"sqlite:///{os.path.join(directory, 'bench.db')}", sqlite_profile=profile)
+        single, bulk = listings[:len(listings) // 10], listings[len(listings) // 10:]
+
+        start = time.perf_counter()
+        for listing in single:
+            db.add_listing(listing)
+        single_rate = len(single) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db.add_listings(bulk)
+        bulk_rate = len(bulk) / (time.perf_counter() - start)
+        db.session.remove()
+
+        stop = threading.Event()
+        counts = {'reads': 0, 'locked': 0, 'writes': 0}
+        lock = threading.Lock()
+        since = datetime.now() - timedelta(days=1)
+
+        def read():
+            rng = random.Random()
+            while not stop.is_set():
+                low = rng.randrange(800, 4000, 100)
+                try:
+                    with db.session_scope():
+                        db.get_candidate_listings(since, min_price=low, max_price=low + 500)
+                    outcome = 'reads'
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    outcome = 'locked'
+                with lock:
+                    counts[outcome] += 1
+
+        def write():
+            rng = random.Random(1)
+            while not stop.is_set():
+                listing = dict(rng.choice(listings), price=float(rng.randrange(800, 5000, 10)))
+                try:
+                    with db.session_scope():
+                        db.add_listing(listing)
+                    counts['writes'] += 1
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    with lock:
+                        counts['locked'] += 1
+
+        threads = [threading.Thread(target=read) for _ in range(readers)] + [threading.Thread(target=write)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        db.engine.dispose()
+
+    return {
+        'profile': profile,
+        'single': single_rate,
+        'bulk': bulk_rate,
+        'reads': counts['reads'] / seconds,
+        'writes': counts['writes'] / seconds,
+        'locked': counts['locked'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listings', type=int, default=5000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--profiles', nargs='+', default=list(SQLITE_PROFILES), choices=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    listings = make_listings(args.listings)
+    print(f"{'profile':<16}{'single/s':>10}{'bulk/s':>10}{'reads/s':>10}{'writes/s':>10}{'locked':>8}")
+    for profile in args.profiles:
+        result = run_profile(profile, listings, args.readers, args.seconds)
+        print(f"{result['profile']:<16}{result['single']:>10.0f}{result['bulk']:>10.0f}"
+              f"{result['reads']:>10.1f}{result['writes']:>10.1f}{result['locked']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON
+from sqlalchemy import bindparam, cast, create_engine, make_url, inspect, literal, select, text, func, or_, Column, Integer, String, Float, DateTime, JSON, Index
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import hashlib
 import json
+import os
+import threading
+from listing_index import ListingIndex
+from features import encode_features
+from locality import locality_index
+from models import ListingRecord
+from sqlite_pragmas import configure_sqlite
 
 Base = declarative_base()
 
@@ -18,15 +30,32 @@ class Listing(Base):
     rooms = Column(Float)
     size = Column(Float)
     features = Column(JSON)
+    feature_mask = Column(Integer, default=0)
+    localities = Column(String)  # resolved locality IDs as ",3,17,"
     images = Column(JSON)
     link = Column(String)
+    content_hash = Column(String)  # fingerprint of CONTENT_COLUMNS, see content_hash()
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    last_seen_at = Column(DateTime, default=datetime.now)  # last scrape that returned the listing
+    stale_since = Column(DateTime)  # set once scrapers stop returning the listing
+
+    __table_args__ = (
+        # Window scans filtered on the scoring ranges, and price-first lookups
+        Index('ix_listings_created_at_price_rooms_size', 'created_at', 'price', 'rooms', 'size'),
+        Index('ix_listings_price_created_at', 'price', 'created_at'),
+        Index('ix_listings_source_last_seen_at', 'source', 'last_seen_at'),
+    )
 
     @classmethod
     def from_dict(cls, data: dict):
         """Create a Listing instance from a dictionary"""
-        return cls(
+        return cls(**cls.values_from_dict(data))
+
+    @staticmethod
+    def values_from_dict(data: dict) -> dict:
+        """Get the column values stored for a scraped listing dictionary"""
+        values = dict(
             source=data['source'],
             external_id=data.get('external_id', data['link']),
             title=data['title'],
@@ -35,9 +64,134 @@ class Listing(Base):
             rooms=data.get('rooms'),
             size=data.get('size'),
             features=json.dumps(data.get('features', [])),
+            feature_mask=encode_features(data.get('features')),
+            localities=locality_key(data['location']),
             images=json.dumps(data.get('images', [])),
             link=data['link']
         )
+        values['content_hash'] = content_hash(values)
+        return values
+
+    def to_record(self) -> ListingRecord:
+        """Convert the listing to the compact record used by the matcher"""
+        return _to_record(self)
+
+# Columns a ListingRecord is built from, queried without loading full ORM objects
+RECORD_COLUMNS = (
+    Listing.title, Listing.price, Listing.location, Listing.rooms, Listing.size,
+    Listing.features, Listing.feature_mask, Listing.link, Listing.source, Listing.created_at
+)
+
+def _to_record(row) -> ListingRecord:
+    """Build a ListingRecord from a Listing or a row of RECORD_COLUMNS"""
+    features = row.features
+    if isinstance(features, str):
+        features = json.loads(features)
+    feature_mask = row.feature_mask
+    if feature_mask is None:
+        feature_mask = encode_features(features)
+    return ListingRecord(
+        title=row.title,
+        price=row.price,
+        location=row.location,
+        rooms=row.rooms,
+        size=row.size,
+        features=features or [],
+        feature_mask=feature_mask,
+        link=row.link,
+        source=row.source,
+        created_at=row.created_at
+    )
+
+def locality_key(location: str) -> str:
+    """Encode the localities of an address so they can be matched with LIKE '%,id,%'"""
+    return ',' + ','.join(str(locality_id) for locality_id in sorted(locality_index.resolve(location))) + ','
+
+class IngestResult(NamedTuple):
+    """Outcome of a bulk listing ingestion"""
+    inserted: int
+    updated: int
+    unchanged: int
+    new_listings: List[dict]
+
+# Columns fingerprinted by content_hash to decide whether a re-scraped listing changed
+CONTENT_COLUMNS = ('source', 'title', 'price', 'location', 'rooms', 'size', 'features', 'images', 'link')
+
+def _content(values) -> tuple:
+    """Comparable content of a listing, with JSON columns decoded when stored as strings"""
+    content = []
+    for column in CONTENT_COLUMNS:
+        value = values[column]
+        if column in ('features', 'images') and isinstance(value, str):
+            value = json.loads(value)
+        content.append(value)
+    return tuple(content)
+
+def content_hash(values) -> str:
+    """Fingerprint the content of a listing so unchanged re-scrapes can be detected without comparing columns"""
+    content = [
+        float(value) if isinstance(value, (int, float)) else value
+        for value in _content(values)
+    ]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode()).hexdigest()
+
+class ArchivedListing(Base):
+    """Listing moved out of the live table after staying stale for the archive period"""
+    __tablename__ = 'archived_listings'
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String)
+    external_id = Column(String, index=True)
+    title = Column(String)
+    price = Column(Float)
+    location = Column(String)
+    rooms = Column(Float)
+    size = Column(Float)
+    features = Column(JSON)
+    images = Column(JSON)
+    link = Column(String)
+    created_at = Column(DateTime)
+    last_seen_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.now)
+
+class ListingChange(Base):
+    """Append-only log of listing changes, written in the same transaction as the listing itself"""
+    __tablename__ = 'listing_changes'
+
+    id = Column(Integer, primary_key=True)  # sequence number, consumers keep the last one they read
+    external_id = Column(String, index=True)
+    event = Column(String)  # new, price_changed, updated, removed
+    price = Column(Float)
+    previous_price = Column(Float)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+    # Never reuse the sequence numbers of deleted changes
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class ConsumerCursor(Base):
+    """Position of a change log consumer, the sequence number of the last change it handled"""
+    __tablename__ = 'consumer_cursors'
+
+    name = Column(String, primary_key=True)
+    position = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+def _listing_change(external_id: str, price: float, stored_price: Optional[float] = None,
+                    is_new: bool = False, now: datetime = None) -> dict:
+    """Column values of the change logged for an inserted or updated listing"""
+    if is_new:
+        event = 'new'
+    elif stored_price != price:
+        event = 'price_changed'
+    else:
+        event = 'updated'
+    return dict(
+        external_id=external_id,
+        event=event,
+        price=price,
+        previous_price=None if is_new else stored_price,
+        created_at=now or datetime.now()
+    )
 
 class SearchProfile(Base):
     __tablename__ = 'search_profiles'
@@ -49,42 +203,586 @@ class SearchProfile(Base):
     created_at = Column(DateTime, default=datetime.now)
     last_notification = Column(DateTime)
 
-class Database:
-    def __init__(self, db_url="sqlite:///apartments.db"):
-        self.engine = create_engine(db_url)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-
-    def add_listing(self, listing_data: dict):
-        """Add or update a listing in the database"""
-        listing = Listing.from_dict(listing_data)
-        existing = self.session.query(Listing).filter_by(external_id=listing.external_id).first()
-        
-        if existing:
-            # Update existing listing
-            for key, value in listing_data.items():
-                if key not in ['id', 'created_at']:
-                    setattr(existing, key, value)
+    __table_args__ = (
+        # Profile pages of a subscriber, walked by id
+        Index('ix_search_profiles_user_email_id', 'user_email', 'id'),
+        Index('ix_search_profiles_notification_frequency', 'notification_frequency'),
+    )
+
+# Frequencies matched by the scheduler, each profile of one reads the change log through its own cursor
+SCHEDULED_FREQUENCIES = ('hourly', 'daily')
+PROFILE_CURSOR_PREFIX = 'matching:profile:'
+
+def profile_cursor_name(profile_id: int) -> str:
+    """Change log cursor of a profile's scheduled matching"""
+    return f'{PROFILE_CURSOR_PREFIX}{profile_id}'
+
+def _orphaned_cursors():
+    """Delete the matching cursors whose profile was deleted or is no longer scheduled"""
+    live = select(literal(PROFILE_CURSOR_PREFIX) + cast(SearchProfile.id, String)).where(
+        SearchProfile.notification_frequency.in_(SCHEDULED_FREQUENCIES)
+    )
+    return ConsumerCursor.__table__.delete().where(
+        ConsumerCursor.name.like('matching:%'), ConsumerCursor.name.not_in(live)
+    )
+
+def _new_profile(email: str, criteria: dict, frequency: str = "daily") -> SearchProfile:
+    """Build a search profile row"""
+    return SearchProfile(user_email=email, criteria=json.dumps(criteria), notification_frequency=frequency)
+
+def _profiles_page(email: str, after_id: int = None, limit: int = 50):
+    """Select a page of a subscriber's profiles in id order, starting after the given id"""
+    statement = select(SearchProfile).where(SearchProfile.user_email == email)
+    if after_id is not None:
+        statement = statement.where(SearchProfile.id > after_id)
+    return statement.order_by(SearchProfile.id).limit(limit)
+
+def _update_profile(profile: SearchProfile, criteria: dict = None, frequency: str = None):
+    """Apply the given criteria and notification frequency to a profile"""
+    if criteria is not None:
+        profile.criteria = json.dumps(criteria)
+    if frequency is not None:
+        profile.notification_frequency = frequency
+
+def _pool_arguments(db_url: str, pool_size: int, max_overflow: int) -> dict:
+    """
+    Pool sizing for engines on a file or server database
+    In-memory SQLite uses a pool without a size, so it gets none
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return {'pool_size': pool_size, 'max_overflow': max_overflow}
+
+def _create_engine(db_url: str, pool_size: int, max_overflow: int, sqlite_profile: str):
+    """Create a pooled engine with connections checked before use"""
+    pool_arguments = _pool_arguments(db_url, pool_size, max_overflow)
+    if db_url.startswith('sqlite'):
+        engine = create_engine(
+            db_url,
+            pool_pre_ping=True,
+            **pool_arguments,
+            # Pooled connections are handed to whichever thread checks them out
+            connect_args={'check_same_thread': False}
+        )
+        configure_sqlite(engine, sqlite_profile)
+        return engine
+
+    return create_engine(db_url, pool_pre_ping=True, **pool_arguments)
+
+# Async drivers used for each synchronous database URL scheme
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+def _create_async_engine(db_url: str, pool_size: int, max_overflow: int, sqlite_profile: str):
+    """Create a pooled asyncio engine, picking the async driver for the URL's database"""
+    scheme, rest = db_url.split('://', 1)
+    db_url = ASYNC_DRIVERS.get(scheme.split('+')[0], scheme) + '://' + rest
+    pool_arguments = _pool_arguments(db_url, pool_size, max_overflow)
+    if db_url.startswith('sqlite'):
+        engine = create_async_engine(db_url, pool_pre_ping=True, **pool_arguments)
+        configure_sqlite(engine.sync_engine, sqlite_profile)
+        return engine
+
+    return create_async_engine(db_url, pool_pre_ping=True, **pool_arguments)
+
+def _upgrade_schema(connection):
+    """Create missing tables, then add columns and indexes introduced after a table was first created"""
+    Base.metadata.create_all(connection)
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    _backfill_content_hashes(connection)
+    _backfill_locality_keys(connection)
+
+def _backfill_content_hashes(connection):
+    """Fingerprint listings stored before content hashes were kept"""
+    rows = connection.execute(
+        select(Listing.id, *[getattr(Listing, column) for column in CONTENT_COLUMNS])
+        .where(Listing.content_hash.is_(None))
+    ).all()
+    if rows:
+        connection.execute(
+            Listing.__table__.update().where(Listing.id == bindparam('row_id')).values(content_hash=bindparam('hash')),
+            [{'row_id': row.id, 'hash': content_hash(row._mapping)} for row in rows]
+        )
+
+def _backfill_locality_keys(connection):
+    """Re-resolve the localities of listings whose key was written by older resolution rules or locality data"""
+    rows = connection.execute(select(Listing.id, Listing.location, Listing.localities)).all()
+    stale = [
+        {'row_id': row.id, 'key': key} for row in rows
+        for key in [locality_key(row.location)] if key != row.localities
+    ]
+    if stale:
+        connection.execute(
+            Listing.__table__.update().where(Listing.id == bindparam('row_id')).values(localities=bindparam('key')),
+            stale
+        )
+
+def _save_listing(session, listing_data: dict) -> Tuple[bool, Optional[Listing]]:
+    """
+    Add or update one listing and log its change, without committing
+    Returns whether the listing was new, and its stored row, None when it was re-scraped without changes
+    """
+    listing = Listing.from_dict(listing_data)
+    existing = session.query(Listing).filter_by(external_id=listing.external_id).first()
+    if existing and existing.content_hash == listing.content_hash and existing.stale_since is None:
+        # Re-scraped without changes, only record that it is still on the market
+        session.execute(
+            Listing.__table__.update().where(Listing.id == existing.id)
+            .values(last_seen_at=datetime.now(), updated_at=Listing.updated_at)
+        )
+        return False, None
+
+    if existing:
+        session.add(ListingChange(**_listing_change(
+            existing.external_id, listing.price, stored_price=existing.price
+        )))
+        # Update existing listing
+        for key, value in listing_data.items():
+            if key not in ['id', 'created_at']:
+                setattr(existing, key, value)
+        if 'features' in listing_data:
+            existing.feature_mask = encode_features(listing_data['features'])
+        if 'location' in listing_data:
+            existing.localities = locality_key(listing_data['location'])
+        existing.content_hash = listing.content_hash
+        existing.last_seen_at = datetime.now()
+        existing.stale_since = None
+        return False, existing
+
+    # Add new listing
+    session.add(listing)
+    session.add(ListingChange(**_listing_change(listing.external_id, listing.price, is_new=True)))
+    return True, listing
+
+def _upsert_chunk(session, chunk: List[Tuple[str, dict]]) -> Tuple[IngestResult, List[Tuple[str, ListingRecord]]]:
+    """
+    Write one batch of (external_id, listing) pairs with a single upsert statement, without committing
+    Returns the batch counts and the records of the rows that were written
+    """
+    insert = sqlite.insert if session.get_bind().dialect.name == 'sqlite' else postgresql.insert
+    existing = {
+        row.external_id: row
+        for row in session.execute(
+            select(Listing.external_id, Listing.created_at, Listing.price, Listing.content_hash, Listing.stale_since)
+            .where(Listing.external_id.in_([external_id for external_id, _ in chunk]))
+        )
+    }
+
+    now = datetime.now()
+    updated, unchanged, new_listings = 0, 0, []
+    rows, records, changes, seen = [], [], [], []
+    for external_id, listing in chunk:
+        values = Listing.values_from_dict(listing)
+        stored = existing.get(external_id)
+        if stored is not None and stored.content_hash == values['content_hash'] and stored.stale_since is None:
+            unchanged += 1
+            seen.append(external_id)
+            continue
+        if stored is None:
+            new_listings.append(listing)
+            values['created_at'] = now
         else:
-            # Add new listing
-            self.session.add(listing)
-        
+            updated += 1
+            values['created_at'] = stored.created_at
+        values['updated_at'] = now
+        values['last_seen_at'] = now
+        values['stale_since'] = None
+        rows.append(values)
+        records.append((external_id, _to_record(Listing(**values))))
+        changes.append(_listing_change(
+            external_id, values['price'],
+            stored_price=None if stored is None else stored.price,
+            is_new=stored is None, now=now
+        ))
+
+    if rows:
+        statement = insert(Listing).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=['external_id'],
+            set_={
+                column: statement.excluded[column]
+                for column in CONTENT_COLUMNS + (
+                    'feature_mask', 'localities', 'content_hash', 'updated_at', 'last_seen_at', 'stale_since'
+                )
+            }
+        )
+        session.execute(statement)
+        session.execute(ListingChange.__table__.insert(), changes)
+    if seen:
+        # Unchanged listings only record that they are still on the market, updated_at is kept
+        session.execute(
+            Listing.__table__.update().where(Listing.external_id.in_(seen))
+            .values(last_seen_at=now, updated_at=Listing.updated_at)
+        )
+
+    return IngestResult(len(new_listings), updated, unchanged, new_listings), records
+
+def _latest_listings(listings: List[dict]) -> List[Tuple[str, dict]]:
+    """Key listings by external_id, the last copy wins when a scrape returns the same listing twice"""
+    latest: Dict[str, dict] = {}
+    for listing in listings:
+        latest[Listing.values_from_dict(listing)['external_id']] = listing
+    return list(latest.items())
+
+def _candidate_statement(since: datetime,
+                         min_price: Optional[float] = None, max_price: Optional[float] = None,
+                         min_rooms: Optional[float] = None, max_rooms: Optional[float] = None,
+                         min_size: Optional[float] = None, max_size: Optional[float] = None,
+                         sources: Optional[Iterable[str]] = None,
+                         localities: Optional[Iterable[int]] = None,
+                         location_contains: Optional[str] = None):
+    """Select the record columns of listings added since a datetime that satisfy the given hard bounds"""
+    statement = select(Listing.external_id, *RECORD_COLUMNS).where(
+        Listing.created_at >= since, Listing.stale_since.is_(None)
+    )
+    for column, low, high in ((Listing.price, min_price, max_price),
+                              (Listing.rooms, min_rooms, max_rooms),
+                              (Listing.size, min_size, max_size)):
+        if low is not None:
+            statement = statement.where(column >= low)
+        if high is not None:
+            statement = statement.where(column <= high)
+    if sources:
+        statement = statement.where(Listing.source.in_(list(sources)))
+    if localities:
+        # Rows written before localities were stored cannot be ruled out
+        statement = statement.where(or_(
+            Listing.localities.is_(None),
+            *[Listing.localities.like(f'%,{locality_id},%') for locality_id in localities]
+        ))
+    if location_contains:
+        statement = statement.where(func.lower(Listing.location).contains(location_contains.lower()))
+    return statement
+
+class Database:
+    def __init__(self, db_url: str = None, pool_size: int = None, max_overflow: int = None,
+                 sqlite_profile: str = None, snapshot_dir: str = None):
+        db_url = db_url or os.getenv("DATABASE_URL", "sqlite:///apartments.db")
+        self.engine = _create_engine(
+            db_url,
+            pool_size=pool_size or int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=max_overflow if max_overflow is not None else int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            sqlite_profile=sqlite_profile or os.getenv("SQLITE_PROFILE", "wal")
+        )
+        with self.engine.begin() as connection:
+            _upgrade_schema(connection)
+        # Every thread gets its own session, released at the end of its unit of work
+        self.session = scoped_session(sessionmaker(bind=self.engine))
+        # Listing index snapshots are shared through this directory, see save_listing_snapshot
+        self.snapshot_dir = snapshot_dir or os.getenv("LISTING_SNAPSHOT_DIR")
+        self.listing_index = None
+        self._index_position = 0
+        self._index_lock = threading.RLock()
+
+    @contextmanager
+    def session_scope(self):
+        """
+        Run a unit of work on the current thread's session
+        Commits on success, rolls back on error and releases the session either way
+        """
+        try:
+            yield self.session
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        finally:
+            self.session.remove()
+
+    def add_listing(self, listing_data: dict) -> bool:
+        """Add or update a listing in the database, returning True if it was new"""
+        is_new, stored = _save_listing(self.session, listing_data)
         self.session.commit()
 
+        # Keep the in-memory index current without reloading it
+        if stored is not None:
+            with self._index_lock:
+                if self.listing_index is not None:
+                    self.listing_index.upsert(stored.external_id, stored.to_record())
+
+        return is_new
+
+    def add_listings(self, listings: List[dict], batch_size: int = 500) -> IngestResult:
+        """
+        Add or update many listings, one transaction and one upsert statement per batch
+        Rows whose content did not change are left untouched
+        """
+        dialect = self.engine.dialect.name
+        if dialect not in ('sqlite', 'postgresql'):
+            new_listings = [listing for listing in listings if self.add_listing(listing)]
+            return IngestResult(len(new_listings), len(listings) - len(new_listings), 0, new_listings)
+
+        inserted, updated, unchanged, new_listings = 0, 0, 0, []
+        items = _latest_listings(listings)
+        for start in range(0, len(items), batch_size):
+            result, records = _upsert_chunk(self.session, items[start:start + batch_size])
+            self.session.commit()
+            inserted += result.inserted
+            updated += result.updated
+            unchanged += result.unchanged
+            new_listings.extend(result.new_listings)
+
+            with self._index_lock:
+                if self.listing_index is not None:
+                    for external_id, record in records:
+                        self.listing_index.upsert(external_id, record)
+
+        return IngestResult(inserted, updated, unchanged, new_listings)
+
     def get_new_listings(self, since: datetime):
         """Get listings added since the given datetime"""
-        return self.session.query(Listing).filter(Listing.created_at >= since).all()
-
-    def add_search_profile(self, email: str, criteria: dict, frequency: str = "daily"):
-        """Add a new search profile"""
-        profile = SearchProfile(
-            user_email=email,
-            criteria=json.dumps(criteria),
-            notification_frequency=frequency
+        return self.session.query(Listing).filter(Listing.created_at >= since, Listing.stale_since.is_(None)).all()
+
+    def remove_listings(self, external_ids: Iterable[str]) -> int:
+        """Delete listings, logging a removed change for each, and return how many were deleted"""
+        external_ids = list(external_ids)
+        stored = self.session.query(Listing.external_id, Listing.price).filter(
+            Listing.external_id.in_(external_ids)
+        ).all()
+        if not stored:
+            return 0
+
+        now = datetime.now()
+        self.session.execute(ListingChange.__table__.insert(), [
+            dict(external_id=row.external_id, event='removed', previous_price=row.price, created_at=now)
+            for row in stored
+        ])
+        self.session.query(Listing).filter(
+            Listing.external_id.in_([row.external_id for row in stored])
+        ).delete(synchronize_session=False)
+        self.session.commit()
+
+        with self._index_lock:
+            if self.listing_index is not None:
+                for row in stored:
+                    self.listing_index.remove(row.external_id)
+        return len(stored)
+
+    def mark_stale_listings(self, stale_after: timedelta) -> int:
+        """
+        Mark listings stale when their source's scrapes stopped returning them for the given time
+        Time is measured from the source's latest scrape, so a failing scraper does not stale its listings
+        Returns how many listings were marked
+        """
+        now = datetime.now()
+        last_seen = func.coalesce(Listing.last_seen_at, Listing.updated_at)
+        stale = []
+        for source, latest in self.session.query(Listing.source, func.max(last_seen)).group_by(Listing.source):
+            stale.extend(self.session.query(Listing.external_id, Listing.price).filter(
+                Listing.source == source, Listing.stale_since.is_(None), last_seen < latest - stale_after
+            ))
+        if not stale:
+            return 0
+
+        # Consumers of the change log drop them like removed listings
+        self.session.execute(ListingChange.__table__.insert(), [
+            dict(external_id=row.external_id, event='removed', previous_price=row.price, created_at=now)
+            for row in stale
+        ])
+        for start in range(0, len(stale), 500):
+            self.session.execute(
+                Listing.__table__.update()
+                .where(Listing.external_id.in_([row.external_id for row in stale[start:start + 500]]))
+                .values(stale_since=now)
+            )
+        self.session.commit()
+
+        with self._index_lock:
+            if self.listing_index is not None:
+                for row in stale:
+                    self.listing_index.remove(row.external_id)
+        return len(stale)
+
+    def archive_listings(self, archive_after: timedelta) -> int:
+        """
+        Move listings stale for longer than the given time to the archive table
+        Change log entries older than that, and already read by every consumer, are deleted too
+        Returns how many listings were archived
+        """
+        cutoff = datetime.now() - archive_after
+        expired = select(Listing.id).where(Listing.stale_since < cutoff)
+        columns = [column.name for column in ArchivedListing.__table__.columns if column.name not in ('id', 'archived_at')]
+        archived = self.session.execute(
+            ArchivedListing.__table__.insert().from_select(
+                columns, select(*[getattr(Listing, column) for column in columns]).where(Listing.id.in_(expired))
+            )
+        ).rowcount
+        self.session.execute(Listing.__table__.delete().where(Listing.id.in_(expired)))
+
+        # A cursor nobody advances anymore would keep the whole log
+        self.session.execute(_orphaned_cursors())
+        consumed = self.session.query(func.min(ConsumerCursor.position)).scalar()
+        if consumed is not None:
+            self.session.execute(ListingChange.__table__.delete().where(
+                ListingChange.id <= consumed, ListingChange.created_at < cutoff
+            ))
+        self.session.commit()
+        return archived
+
+    def optimize(self):
+        """Reclaim the space freed by archiving and refresh the query planner statistics"""
+        dialect = self.engine.dialect.name
+        # VACUUM cannot run inside a transaction
+        with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            if dialect == 'sqlite':
+                connection.execute(text('VACUUM'))
+                connection.execute(text('ANALYZE'))
+            elif dialect == 'postgresql':
+                for table in Base.metadata.sorted_tables:
+                    connection.execute(text(f'VACUUM ANALYZE {table.name}'))
+
+    def get_changes(self, after: int, limit: int = None) -> List[ListingChange]:
+        """Get the logged listing changes with a sequence number above the given one, oldest first"""
+        query = self.session.query(ListingChange).filter(ListingChange.id > after).order_by(ListingChange.id)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+    def get_cursor(self, name: str, since: datetime = None) -> int:
+        """
+        Get the position of a change log consumer
+        A new consumer starts before the first change logged at or after since, or at the beginning
+        """
+        cursor = self.session.get(ConsumerCursor, name)
+        if cursor is not None:
+            return cursor.position
+        if since is None:
+            return 0
+        position = self.session.query(func.max(ListingChange.id)).filter(ListingChange.created_at < since).scalar()
+        return position or 0
+
+    def get_cursors(self, names: Iterable[str]) -> Dict[str, int]:
+        """Get the positions of several change log consumers, consumers without a saved position are left out"""
+        names = list(names)
+        positions = {}
+        for start in range(0, len(names), 500):
+            positions.update(
+                self.session.query(ConsumerCursor.name, ConsumerCursor.position)
+                .filter(ConsumerCursor.name.in_(names[start:start + 500]))
+            )
+        return positions
+
+    def save_cursor(self, name: str, position: int):
+        """Record the sequence number of the last change a consumer handled"""
+        self.save_cursors({name: position})
+
+    def save_cursors(self, positions: Dict[str, int]):
+        """Record the positions of several change log consumers in one transaction"""
+        names = list(positions)
+        cursors = {}
+        for start in range(0, len(names), 500):
+            cursors.update(
+                (cursor.name, cursor)
+                for cursor in self.session.query(ConsumerCursor).filter(ConsumerCursor.name.in_(names[start:start + 500]))
+            )
+        for name, position in positions.items():
+            if name in cursors:
+                cursors[name].position = position
+            else:
+                self.session.add(ConsumerCursor(name=name, position=position))
+        self.session.commit()
+
+    def get_listing_records(self, external_ids: Iterable[str]) -> Dict[str, ListingRecord]:
+        """Get the records of the given listings keyed by external_id, missing ones are left out"""
+        external_ids = list(external_ids)
+        records = {}
+        # Chunked so the IN list stays below the bound parameter limits
+        for start in range(0, len(external_ids), 500):
+            rows = self.session.execute(
+                select(Listing.external_id, *RECORD_COLUMNS)
+                .where(Listing.external_id.in_(external_ids[start:start + 500]), Listing.stale_since.is_(None))
+            )
+            records.update((row.external_id, _to_record(row)) for row in rows)
+        return records
+
+    def get_candidate_listings(self, since: datetime,
+                               min_price: Optional[float] = None, max_price: Optional[float] = None,
+                               min_rooms: Optional[float] = None, max_rooms: Optional[float] = None,
+                               min_size: Optional[float] = None, max_size: Optional[float] = None,
+                               sources: Optional[Iterable[str]] = None,
+                               localities: Optional[Iterable[int]] = None,
+                               location_contains: Optional[str] = None) -> Dict[str, ListingRecord]:
+        """
+        Get the listings added since the given datetime that satisfy the given hard bounds
+        Returns records keyed by external_id; bounds left to None are not filtered on
+        """
+        statement = _candidate_statement(
+            since, min_price, max_price, min_rooms, max_rooms, min_size, max_size,
+            sources, localities, location_contains
         )
+        rows = self.session.execute(statement.execution_options(yield_per=1000))
+        return {row.external_id: _to_record(row) for row in rows}
+
+    def get_listing_index(self) -> ListingIndex:
+        """
+        Get the in-memory listing index, loading it on first use
+        Starts from the listing snapshot when there is one, then replays the change log past its position
+        Later calls only replay changes logged since the previous sync, e.g. by another process
+        """
+        with self._index_lock:
+            if self.listing_index is None:
+                snapshot = ListingIndex.load_snapshot(self.snapshot_dir) if self.snapshot_dir else None
+                if snapshot is not None:
+                    self.listing_index, self._index_position = snapshot
+                else:
+                    self._load_listing_index()
+
+            changes = self.get_changes(self._index_position)
+            if changes:
+                changed = {change.external_id for change in changes}
+                records = self.get_listing_records(changed)
+                for external_id in changed:
+                    if external_id in records:
+                        self.listing_index.upsert(external_id, records[external_id])
+                    else:
+                        # Removed, stale or archived since
+                        self.listing_index.remove(external_id)
+                self._index_position = changes[-1].id
+
+            return self.listing_index
+
+    def _load_listing_index(self):
+        """Build the listing index from every live listing"""
+        # Changes logged while the table is read are replayed afterwards
+        self._index_position = self.session.query(func.max(ListingChange.id)).scalar() or 0
+        self.listing_index = ListingIndex()
+        query = self.session.query(Listing.external_id, *RECORD_COLUMNS).filter(Listing.stale_since.is_(None))
+        # Rows are read as plain tuples, no ORM objects enter the session
+        for row in query.yield_per(1000):
+            self.listing_index.upsert(row.external_id, _to_record(row))
+
+    def save_listing_snapshot(self) -> Optional[str]:
+        """
+        Write the listing index as a memory-mappable snapshot other processes can start from
+        Returns the snapshot directory, or None when no snapshot directory is configured
+        """
+        if not self.snapshot_dir:
+            return None
+        with self._index_lock:
+            index = self.get_listing_index()
+            return index.save_snapshot(self.snapshot_dir, self._index_position)
+
+    def add_search_profile(self, email: str, criteria: dict, frequency: str = "daily") -> int:
+        """Add a new search profile, returning its id"""
+        profile = _new_profile(email, criteria, frequency)
         self.session.add(profile)
         self.session.commit()
+        return profile.id
+
+    def add_search_profiles(self, profiles: List[dict]) -> List[int]:
+        """Add many search profiles in one transaction, each a dict of email, criteria and frequency"""
+        rows = [_new_profile(**profile) for profile in profiles]
+        self.session.add_all(rows)
+        self.session.commit()
+        return [profile.id for profile in rows]
 
     def get_search_profiles(self, frequency: str = None):
         """Get all search profiles, optionally filtered by notification frequency"""
@@ -93,9 +791,163 @@ class Database:
             query = query.filter_by(notification_frequency=frequency)
         return query.all()
 
+    def get_profiles_by_email(self, email: str, after_id: int = None, limit: int = 50) -> List[SearchProfile]:
+        """Get up to limit profiles of a subscriber with an id above after_id, in id order"""
+        return list(self.session.scalars(_profiles_page(email, after_id, limit)))
+
+    def update_profile(self, profile_id: int, criteria: dict = None, frequency: str = None) -> bool:
+        """Change the criteria and/or notification frequency of a profile, returning False if it does not exist"""
+        profile = self.session.get(SearchProfile, profile_id)
+        if profile is None:
+            return False
+        _update_profile(profile, criteria, frequency)
+        self.session.commit()
+        return True
+
+    def delete_profile(self, profile_id: int) -> bool:
+        """Delete a profile, returning False if it does not exist"""
+        deleted = self.session.query(SearchProfile).filter_by(id=profile_id).delete()
+        self.session.query(ConsumerCursor).filter_by(name=profile_cursor_name(profile_id)).delete()
+        self.session.commit()
+        return deleted > 0
+
     def update_notification_time(self, profile_id: int):
         """Update the last notification time for a search profile"""
         profile = self.session.query(SearchProfile).get(profile_id)
         if profile:
             profile.last_notification = datetime.now()
-            self.session.commit()
\ No newline at end of file
+            self.session.commit()
+
+    def update_notification_times(self, profile_ids: Iterable[int]):
+        """Update the last notification time of several search profiles in one statement"""
+        profile_ids = list(profile_ids)
+        if profile_ids:
+            self.session.query(SearchProfile).filter(SearchProfile.id.in_(profile_ids)).update(
+                {SearchProfile.last_notification: datetime.now()}, synchronize_session='fetch'
+            )
+            self.session.commit()
+
+class AsyncDatabase:
+    """
+    Asyncio counterpart of Database for the FastAPI handlers
+
+    Every call runs in its own session, so concurrent requests never share
+    one. Tables are created or upgraded by initialize(), awaited at startup.
+    """
+    def __init__(self, db_url: str = None, pool_size: int = None, max_overflow: int = None,
+                 sqlite_profile: str = None):
+        db_url = db_url or os.getenv("DATABASE_URL", "sqlite:///apartments.db")
+        self.engine = _create_async_engine(
+            db_url,
+            pool_size=pool_size or int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=max_overflow if max_overflow is not None else int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            sqlite_profile=sqlite_profile or os.getenv("SQLITE_PROFILE", "wal")
+        )
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def initialize(self):
+        """Create missing tables, columns and indexes"""
+        async with self.engine.begin() as connection:
+            await connection.run_sync(_upgrade_schema)
+
+    async def close(self):
+        """Close every pooled connection"""
+        await self.engine.dispose()
+
+    async def add_listing(self, listing_data: dict) -> bool:
+        """Add or update a listing in the database, returning True if it was new"""
+        async with self.Session() as session:
+            is_new, _ = await session.run_sync(_save_listing, listing_data)
+            await session.commit()
+        return is_new
+
+    async def add_listings(self, listings: List[dict], batch_size: int = 500) -> IngestResult:
+        """
+        Add or update many listings, one transaction and one upsert statement per batch
+        Rows whose content did not change are left untouched
+        """
+        inserted, updated, unchanged, new_listings = 0, 0, 0, []
+        items = _latest_listings(listings)
+        async with self.Session() as session:
+            for start in range(0, len(items), batch_size):
+                result, _ = await session.run_sync(_upsert_chunk, items[start:start + batch_size])
+                await session.commit()
+                inserted += result.inserted
+                updated += result.updated
+                unchanged += result.unchanged
+                new_listings.extend(result.new_listings)
+
+        return IngestResult(inserted, updated, unchanged, new_listings)
+
+    async def get_new_listings(self, since: datetime) -> List[Listing]:
+        """Get listings added since the given datetime"""
+        async with self.Session() as session:
+            return list(await session.scalars(
+                select(Listing).where(Listing.created_at >= since, Listing.stale_since.is_(None))
+            ))
+
+    async def get_candidate_listings(self, since: datetime, **bounds) -> Dict[str, ListingRecord]:
+        """
+        Get the listings added since the given datetime that satisfy the given hard bounds
+        Takes the same bounds as Database.get_candidate_listings
+        """
+        async with self.Session() as session:
+            rows = await session.execute(_candidate_statement(since, **bounds))
+            return {row.external_id: _to_record(row) for row in rows}
+
+    async def add_search_profile(self, email: str, criteria: dict, frequency: str = "daily") -> int:
+        """Add a new search profile, returning its id"""
+        async with self.Session() as session:
+            profile = _new_profile(email, criteria, frequency)
+            session.add(profile)
+            await session.commit()
+            return profile.id
+
+    async def add_search_profiles(self, profiles: List[dict]) -> List[int]:
+        """Add many search profiles in one transaction, each a dict of email, criteria and frequency"""
+        async with self.Session() as session:
+            rows = [_new_profile(**profile) for profile in profiles]
+            session.add_all(rows)
+            await session.commit()
+            return [profile.id for profile in rows]
+
+    async def get_search_profiles(self, frequency: str = None) -> List[SearchProfile]:
+        """Get all search profiles, optionally filtered by notification frequency"""
+        statement = select(SearchProfile)
+        if frequency:
+            statement = statement.filter_by(notification_frequency=frequency)
+        async with self.Session() as session:
+            return list(await session.scalars(statement))
+
+    async def get_profiles_by_email(self, email: str, after_id: int = None, limit: int = 50) -> List[SearchProfile]:
+        """Get up to limit profiles of a subscriber with an id above after_id, in id order"""
+        async with self.Session() as session:
+            return list(await session.scalars(_profiles_page(email, after_id, limit)))
+
+    async def update_profile(self, profile_id: int, criteria: dict = None, frequency: str = None) -> bool:
+        """Change the criteria and/or notification frequency of a profile, returning False if it does not exist"""
+        async with self.Session() as session:
+            profile = await session.get(SearchProfile, profile_id)
+            if profile is None:
+                return False
+            _update_profile(profile, criteria, frequency)
+            await session.commit()
+            return True
+
+    async def delete_profile(self, profile_id: int) -> bool:
+        """Delete a profile, returning False if it does not exist"""
+        async with self.Session() as session:
+            result = await session.execute(SearchProfile.__table__.delete().where(SearchProfile.id == profile_id))
+            await session.execute(
+                ConsumerCursor.__table__.delete().where(ConsumerCursor.name == profile_cursor_name(profile_id))
+            )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def update_notification_time(self, profile_id: int):
+        """Update the last notification time for a search profile"""
+        async with self.Session() as session:
+            profile = await session.get(SearchProfile, profile_id)
+            if profile:
+                profile.last_notification = datetime.now()
+                await session.commit()
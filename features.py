@@ -0,0 +1,39 @@
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+# Fixed feature vocabulary, the position of a feature is its bit in the mask
+FEATURE_VOCABULARY = ('balcony', 'elevator', 'parking', 'terrace', 'garden', 'furnished')
+
+FEATURE_BITS: Dict[str, int] = {feature: 1 << bit for bit, feature in enumerate(FEATURE_VOCABULARY)}
+
+# Labels shown on the French versions of the listing sites
+FEATURE_MAPPING = {
+    'balcon': 'balcony',
+    'ascenseur': 'elevator',
+    'parking': 'parking',
+    'garage': 'parking',
+    'terrasse': 'terrace',
+    'jardin': 'garden',
+    'meublé': 'furnished'
+}
+
+_BYTE_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.int64)
+
+def encode_features(features: Optional[Iterable[str]]) -> int:
+    """Encode a list of features as a bitmask, ignoring features outside the vocabulary"""
+    mask = 0
+    for feature in features or ():
+        mask |= FEATURE_BITS.get(feature, 0)
+    return mask
+
+def decode_features(mask: int) -> List[str]:
+    """Decode a bitmask back to the list of features it holds"""
+    return [feature for feature, bit in FEATURE_BITS.items() if mask & bit]
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """Count the set bits of every mask in an array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks).astype(np.int64)
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    counts = _BYTE_POPCOUNT[masks.view(np.uint8)]
+    return counts.reshape(masks.shape + (8,)).sum(axis=-1)
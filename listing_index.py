@@ -0,0 +1,265 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from models import ListingRecord
+
+# Text fields of a snapshot, stored as UTF-8 bytes plus row offsets
+SNAPSHOT_TEXT_FIELDS = ('key', 'title', 'location', 'link', 'source', 'features')
+
+def _save_text(directory: str, name: str, values: Sequence[str]):
+    """Write strings as one UTF-8 buffer and the offsets where each one starts"""
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f'{name}.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(directory, f'{name}_offsets.npy'), offsets)
+
+class _TextColumn:
+    """Memory-mapped strings written by _save_text, decoded on access"""
+    def __init__(self, directory: str, name: str):
+        self.buffer = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, f'{name}_offsets.npy'), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.buffer[self.offsets[row]:self.offsets[row + 1]].tobytes().decode()
+
+    def values(self) -> List[str]:
+        """Decode every string at once"""
+        raw = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        return [raw[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+
+class _SnapshotRecords:
+    """
+    Record list of an index loaded from a snapshot
+    Rows from the snapshot are built from the mapped columns when first read, later rows are appended
+    """
+    def __init__(self, text: Dict[str, _TextColumn], columns: Dict[str, np.ndarray], feature_mask: np.ndarray):
+        self.text = text
+        self.columns = columns
+        self.feature_mask = feature_mask
+        self.base_count = len(feature_mask)
+        self.appended: List[ListingRecord] = []
+
+    def __len__(self) -> int:
+        return self.base_count + len(self.appended)
+
+    def __getitem__(self, row: int) -> ListingRecord:
+        if row >= self.base_count:
+            return self.appended[row - self.base_count]
+        rooms, size, created_at = (float(self.columns[field][row]) for field in ('rooms', 'size', 'created_at'))
+        return ListingRecord(
+            title=self.text['title'][row],
+            price=float(self.columns['price'][row]),
+            location=self.text['location'][row],
+            rooms=None if np.isnan(rooms) else rooms,
+            size=None if np.isnan(size) else size,
+            features=json.loads(self.text['features'][row]),
+            feature_mask=int(self.feature_mask[row]),
+            link=self.text['link'][row],
+            source=self.text['source'][row],
+            created_at=datetime.fromtimestamp(created_at) if created_at else None
+        )
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def append(self, record: ListingRecord):
+        self.appended.append(record)
+
+class ListingIndex:
+    """
+    In-memory range index over listing price, rooms and size
+
+    Listings are appended as they are ingested. Each range field keeps a
+    sorted copy of its values for the rows seen at the last merge; rows added
+    since then sit in a short unsorted tail that queries scan directly.
+    """
+    RANGE_FIELDS = ('price', 'rooms', 'size')
+
+    def __init__(self, merge_threshold: int = 1024):
+        self.merge_threshold = merge_threshold
+        self.records: List[ListingRecord] = []
+        self.rows: Dict[str, int] = {}
+        self._columns = {
+            field: np.zeros(0, dtype=float)
+            for field in self.RANGE_FIELDS + ('created_at',)
+        }
+        self._live = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._sorted_count = 0
+        self._sorted_values: Dict[str, np.ndarray] = {}
+        self._sorted_rows: Dict[str, np.ndarray] = {}
+        self._merge()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def upsert(self, key: str, record: ListingRecord):
+        """Add a listing, replacing the previous version stored under the same key"""
+        previous = self.rows.get(key)
+        if previous is not None:
+            self._live[previous] = False
+
+        row = self._count
+        if row == len(self._live):
+            self._grow()
+        self._columns['price'][row] = record.price
+        self._columns['rooms'][row] = np.nan if record.rooms is None else record.rooms
+        self._columns['size'][row] = np.nan if record.size is None else record.size
+        self._columns['created_at'][row] = record.created_at.timestamp() if record.created_at else 0.0
+        self._live[row] = True
+        self.records.append(record)
+        self.rows[key] = row
+        self._count += 1
+
+        if self._count - self._sorted_count >= self.merge_threshold:
+            self._merge()
+
+    def remove(self, key: str):
+        """Drop the listing stored under a key"""
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self._live[row] = False
+
+    def live_rows(self) -> np.ndarray:
+        """Get the row numbers of every current listing"""
+        return np.flatnonzero(self._live[:self._count])
+
+    def column(self, field: str) -> np.ndarray:
+        """Get the values of a field for every row"""
+        return self._columns[field][:self._count]
+
+    def range_rows(self, field: str, low: float, high: float) -> np.ndarray:
+        """Get the sorted row numbers of current listings with low <= field <= high"""
+        values = self._sorted_values[field]
+        start = np.searchsorted(values, low, side='left')
+        end = np.searchsorted(values, high, side='right')
+        rows = self._sorted_rows[field][start:end]
+
+        # Rows added since the last merge are scanned directly
+        tail = self._columns[field][self._sorted_count:self._count]
+        tail_rows = np.flatnonzero((low <= tail) & (tail <= high)) + self._sorted_count
+
+        rows = np.concatenate([rows, tail_rows])
+        return np.sort(rows[self._live[rows]])
+
+    def rows_since(self, rows: np.ndarray, since: datetime) -> np.ndarray:
+        """Keep the rows created at or after the given datetime"""
+        return rows[self._columns['created_at'][rows] >= since.timestamp()]
+
+    def records_for(self, rows: np.ndarray) -> List[ListingRecord]:
+        """Get the listing records stored at the given rows"""
+        return [self.records[row] for row in rows.tolist()]
+
+    def save_snapshot(self, root: str, position: int) -> str:
+        """
+        Write the current listings as memory-mappable columns under root, tagged with a change log position
+        The snapshot becomes current atomically, processes still mapping an older one keep reading it
+        """
+        live = self.live_rows()
+        keys = {row: key for key, row in self.rows.items()}
+        records = self.records_for(live)
+
+        os.makedirs(root, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix='snapshot-', dir=root)
+        for field in self.RANGE_FIELDS + ('created_at',):
+            np.save(os.path.join(directory, f'{field}.npy'), self.column(field)[live])
+        np.save(os.path.join(directory, 'feature_mask.npy'),
+                np.array([record.feature_mask for record in records], dtype=np.uint64))
+        text = {
+            'key': [keys[row] for row in live.tolist()],
+            'title': [record.title for record in records],
+            'location': [record.location for record in records],
+            'link': [record.link for record in records],
+            'source': [record.source for record in records],
+            'features': [json.dumps(record.features or []) for record in records],
+        }
+        for name in SNAPSHOT_TEXT_FIELDS:
+            _save_text(directory, name, text[name])
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'position': position, 'count': len(live), 'created_at': datetime.now().isoformat()}, f)
+
+        # Point CURRENT at the new snapshot, then drop the older ones
+        pointer = os.path.join(root, 'CURRENT.tmp')
+        with open(pointer, 'w') as f:
+            f.write(os.path.basename(directory))
+        os.replace(pointer, os.path.join(root, 'CURRENT'))
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith('snapshot-') and path != directory:
+                shutil.rmtree(path, ignore_errors=True)
+        return directory
+
+    @classmethod
+    def load_snapshot(cls, root: str, merge_threshold: int = 1024) -> Optional[Tuple['ListingIndex', int]]:
+        """
+        Memory-map the current snapshot under root
+        Returns the index and the change log position it reflects, or None when there is no snapshot
+        """
+        try:
+            with open(os.path.join(root, 'CURRENT')) as f:
+                directory = os.path.join(root, f.read().strip())
+            with open(os.path.join(directory, 'meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        columns = {
+            field: np.load(os.path.join(directory, f'{field}.npy'), mmap_mode='r')
+            for field in cls.RANGE_FIELDS + ('created_at',)
+        }
+        text = {name: _TextColumn(directory, name) for name in SNAPSHOT_TEXT_FIELDS}
+        keys = text.pop('key')
+
+        index = cls.__new__(cls)
+        index.merge_threshold = merge_threshold
+        index.records = _SnapshotRecords(text, columns, np.load(os.path.join(directory, 'feature_mask.npy'), mmap_mode='r'))
+        index.rows = {key: row for row, key in enumerate(keys.values())}
+        # Mapped pages stay shared until the first upsert copies the columns to grow them
+        index._columns = dict(columns)
+        index._live = np.ones(len(keys), dtype=bool)
+        index._count = len(keys)
+        index._sorted_count = 0
+        index._sorted_values = {}
+        index._sorted_rows = {}
+        index._merge()
+        return index, meta['position']
+
+    def _grow(self):
+        """Double the capacity of the column arrays"""
+        capacity = max(64, 2 * len(self._live))
+        for field, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=float)
+            grown[:len(column)] = column
+            self._columns[field] = grown
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live
+        self._live = live
+
+    def _merge(self):
+        """Fold the unsorted tail into the sorted columns, dropping replaced rows"""
+        live = self.live_rows()
+        if len(live) < self._count:
+            # Compact so replaced versions stop taking space
+            self.records = [self.records[row] for row in live.tolist()]
+            for field, column in self._columns.items():
+                self._columns[field] = column[live]
+            self._live = np.ones(len(live), dtype=bool)
+            renumbered = {row: new_row for new_row, row in enumerate(live.tolist())}
+            self.rows = {key: renumbered[row] for key, row in self.rows.items()}
+            self._count = len(live)
+
+        for field in self.RANGE_FIELDS:
+            values = self.column(field)
+            order = np.argsort(values, kind='stable')
+            self._sorted_rows[field] = order
+            self._sorted_values[field] = values[order]
+        self._sorted_count = self._count
@@ -0,0 +1,138 @@
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from functools import lru_cache
+import re
+import unicodedata
+
+def _postcodes(*ranges) -> List[int]:
+    """Expand postcodes given as numbers or (first, last) ranges"""
+    codes = []
+    for item in ranges:
+        if isinstance(item, tuple):
+            codes.extend(range(item[0], item[1] + 1))
+        else:
+            codes.append(item)
+    return codes
+
+# Canonical name, name variants (French/German/Italian/English) and postcodes
+SWISS_LOCALITIES: List[Tuple[str, List[str], List[int]]] = [
+    ('Zürich', ['zurich', 'zuerich', 'zurigo'],
+     _postcodes((8001, 8008), 8032, 8037, 8038, 8041, (8044, 8053), 8055, 8057, 8064)),
+    ('Genève', ['geneve', 'genf', 'geneva', 'ginevra'], _postcodes((1201, 1209), 1211)),
+    ('Bern', ['bern', 'berne', 'berna'], _postcodes((3001, 3008), (3010, 3015), (3018, 3020), 3027)),
+    ('Basel', ['basel', 'bale', 'basle', 'basilea'], _postcodes((4001, 4005), (4051, 4059))),
+    ('Lausanne', ['lausanne', 'losanna'], _postcodes((1003, 1007), (1010, 1012), 1015, 1018)),
+    ('Lugano', ['lugano', 'lauis'], _postcodes(6900, 6903, 6906, 6908, 6912, 6963)),
+    ('Winterthur', ['winterthur', 'winterthour'], _postcodes((8400, 8411))),
+    ('Luzern', ['luzern', 'lucerne', 'lucerna'], _postcodes((6002, 6006))),
+    ('St. Gallen', ['st gallen', 'sankt gallen', 'st gall', 'saint gall', 'san gallo'],
+     _postcodes(9000, 9008, (9010, 9016))),
+    ('Biel/Bienne', ['biel', 'bienne'], _postcodes((2500, 2505))),
+    ('Fribourg', ['fribourg', 'freiburg', 'friburgo'], _postcodes(1700, 1701, (1705, 1709))),
+    ('Neuchâtel', ['neuchatel', 'neuenburg'], _postcodes((2000, 2008))),
+    ('Sion', ['sion', 'sitten'], _postcodes(1950, 1951)),
+    ('Thun', ['thun', 'thoune'], _postcodes(3600, (3603, 3609))),
+    ('Chur', ['chur', 'coire', 'coira'], _postcodes((7000, 7007))),
+    ('Zug', ['zug', 'zoug', 'zugo'], _postcodes((6300, 6304))),
+    ('Schaffhausen', ['schaffhausen', 'schaffhouse', 'sciaffusa'], _postcodes((8200, 8208))),
+    ('Aarau', ['aarau'], _postcodes((5000, 5004))),
+    ('Bellinzona', ['bellinzona', 'bellenz'], _postcodes((6500, 6503))),
+    ('Locarno', ['locarno', 'luggarus'], _postcodes((6600, 6605))),
+    ('Solothurn', ['solothurn', 'soleure', 'soletta'], _postcodes((4500, 4503))),
+    ('Montreux', ['montreux'], _postcodes(1820)),
+    ('Vevey', ['vevey', 'vivis'], _postcodes(1800)),
+    ('Nyon', ['nyon'], _postcodes(1260)),
+    ('Morges', ['morges'], _postcodes(1110)),
+    ('Yverdon-les-Bains', ['yverdon les bains', 'yverdon'], _postcodes(1400, 1401)),
+    ('La Chaux-de-Fonds', ['la chaux de fonds', 'chaux de fonds'], _postcodes((2300, 2306))),
+    ('Renens', ['renens'], _postcodes(1020)),
+    ('Pully', ['pully'], _postcodes(1009)),
+    ('Carouge', ['carouge'], _postcodes(1227)),
+    ('Vernier', ['vernier'], _postcodes(1214)),
+    ('Lancy', ['lancy'], _postcodes(1212, 1213)),
+    ('Meyrin', ['meyrin'], _postcodes(1217)),
+    ('Martigny', ['martigny', 'martinach'], _postcodes(1920)),
+    ('Delémont', ['delemont', 'delsberg'], _postcodes(2800)),
+    ('Baden', ['baden'], _postcodes(5400, 5405, 5406)),
+    ('Olten', ['olten'], _postcodes(4600)),
+    ('Köniz', ['koniz', 'koeniz'], _postcodes(3098)),
+    ('Uster', ['uster'], _postcodes(8610)),
+    ('Emmen', ['emmen'], _postcodes(6020, 6032)),
+    ('Kriens', ['kriens'], _postcodes(6010)),
+]
+
+# Postcodes are matched as their own IDs, above every locality ID, so a postcode search stays within it
+POSTCODE_ID_OFFSET = 100000
+
+def normalize_location(text: str) -> str:
+    """Lowercase, strip accents and turn punctuation into single spaces"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+class LocalityIndex:
+    """
+    Resolves free-text addresses and search locations to canonical locality IDs
+    """
+    def __init__(self, localities: Iterable[Tuple[str, List[str], List[int]]] = SWISS_LOCALITIES):
+        self.names: List[str] = []
+        self.variants: Dict[str, int] = {}
+        self.postcodes: Dict[int, int] = {}
+        self.max_variant_words = 1
+        for name, variants, postcodes in localities:
+            self.add(name, variants, postcodes)
+
+        # Addresses repeat a lot across scrapes, so resolutions are memoized
+        self.resolve = lru_cache(maxsize=65536)(self._resolve)
+
+    def add(self, name: str, variants: Iterable[str], postcodes: Iterable[int] = ()) -> int:
+        """Register a locality with its name variants and postcodes, returning its ID"""
+        locality_id = len(self.names)
+        self.names.append(name)
+        for variant in list(variants) + [name]:
+            variant = normalize_location(variant)
+            self.variants[variant] = locality_id
+            self.max_variant_words = max(self.max_variant_words, len(variant.split()))
+        for postcode in postcodes:
+            self.postcodes[postcode] = locality_id
+        return locality_id
+
+    def name(self, locality_id: int) -> str:
+        """Get the canonical name of a locality, or the postcode a postcode ID stands for"""
+        if locality_id >= POSTCODE_ID_OFFSET:
+            return str(locality_id - POSTCODE_ID_OFFSET)
+        return self.names[locality_id]
+
+    def _resolve(self, text: str) -> FrozenSet[int]:
+        """
+        Find the localities of an address, or of a search location
+        A postcode is trusted over names, which are only read after it so street names like "Rue de Genève" are
+        skipped. A bare postcode search resolves to the postcode alone, not to its whole locality
+        """
+        words = normalize_location(text or '').split()
+        postcodes = [index for index, word in enumerate(words) if len(word) == 4 and word.isdigit()]
+        if not postcodes:
+            return self._resolve_names(words)
+
+        # House numbers come before the postcode, so the last four-digit number is taken
+        postcode = int(words[postcodes[-1]])
+        names = words[postcodes[-1] + 1:]
+        found = {POSTCODE_ID_OFFSET + postcode}
+        if not names and postcodes[-1] == 0:
+            return frozenset(found)
+        if postcode in self.postcodes:
+            found.add(self.postcodes[postcode])
+        return frozenset(found | self._resolve_names(names))
+
+    def _resolve_names(self, words: List[str]) -> FrozenSet[int]:
+        """Find every locality named in a list of words"""
+        found = set()
+        # Try the longest multi-word names first, e.g. "la chaux de fonds"
+        for length in range(min(self.max_variant_words, len(words)), 0, -1):
+            for start in range(len(words) - length + 1):
+                locality_id = self.variants.get(' '.join(words[start:start + length]))
+                if locality_id is not None:
+                    found.add(locality_id)
+
+        return frozenset(found)
+
+locality_index = LocalityIndex()
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -23,6 +24,7 @@ logging.basicConfig(level=logging.INFO,
 from scrapers.flatfox_scraper import FlatfoxScraper
 from scrapers.homegate_scraper import HomegateScraper
 from scrapers.immoscout_scraper import ImmoscoutScraper
+from scrapers.base_scraper import shared_driver_pool, warm_shared_driver_pool, close_shared_driver_pool
 from matcher import PropertyMatcher
 
 # Load environment variables
@@ -71,7 +73,7 @@ class MatchResult(BaseModel):
     matching_criteria: List[str]
     missing_criteria: List[str]
 
-# Scraper pool
+# Scrapers, sharing one pool of browsers leased per scrape
 scraper_pool = {
     'flatfox': FlatfoxScraper(),
     'homegate': HomegateScraper(),
@@ -114,9 +116,11 @@ async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.post("/search", response_model=List[MatchResult])
-async def search_apartments(criteria: SearchCriteria, background_tasks: BackgroundTasks):
+async def search_apartments(criteria: SearchCriteria, background_tasks: BackgroundTasks,
+                            top_k: Optional[int] = None, min_score: float = 0.0):
     """
     Search for apartments matching the given criteria across multiple websites
+    Optionally keep only the top_k best matches scoring at least min_score
     """
     logger = logging.getLogger("search")
     start_time = time.time()
@@ -143,18 +147,12 @@ async def search_apartments(criteria: SearchCriteria, background_tasks: Backgrou
             
     logger.info(f"Found {len(all_listings)} total listings before matching")
     
-    # Match listings against criteria
-    matches = matcher.match_listings(criteria, all_listings)
-    
-    # Sort by match score
-    matches.sort(key=lambda x: x.match_score, reverse=True)
+    # Match listings against criteria, best matches first
+    matches = matcher.top_matches(criteria, all_listings, top_k=top_k, min_score=min_score)
     
     duration = time.time() - start_time
     logger.info(f"Search completed in {duration:.2f} seconds. Found {len(matches)} matching listings")
     
-    # Cleanup scrapers
-    background_tasks.add_task(cleanup_scrapers)
-    
     if not matches:
         return JSONResponse(
             content={
@@ -168,15 +166,20 @@ async def search_apartments(criteria: SearchCriteria, background_tasks: Backgrou
     
     return matches
 
+def check_driver_pool():
+    """Lease a browser to check that the driver pool works"""
+    with shared_driver_pool().lease(timeout=30) as pooled:
+        if not pooled.is_healthy():
+            raise RuntimeError("WebDriver is not responding")
+
 @app.get("/healthcheck")
 async def healthcheck():
     """
     Check if the service is running
     """
     try:
-        # Try to initialize a test scraper
-        test_scraper = FlatfoxScraper()
-        test_scraper.cleanup()
+        # Waiting for a lease blocks, so it runs in a worker thread
+        await run_in_threadpool(check_driver_pool)
         return {"status": "healthy", "message": "Service is running normally"}
     except Exception as e:
         raise HTTPException(
@@ -184,15 +187,19 @@ async def healthcheck():
             detail={"status": "unhealthy", "message": str(e)}
         )
 
+@app.on_event("startup")
+async def warm_scrapers():
+    """Start the warm browsers of the scraper driver pool before the first request needs one"""
+    await run_in_threadpool(warm_shared_driver_pool)
+
 def cleanup_scrapers():
-    """Cleanup all scrapers"""
-    for name, scraper in scraper_pool.items():
-        try:
-            logger = logging.getLogger(name)
-            logger.info("Cleaning up scraper resources")
-            scraper.cleanup()
-        except Exception as e:
-            logger.error(f"Error during scraper cleanup: {str(e)}")
+    """Quit the browsers of the scraper driver pool"""
+    logger = logging.getLogger("scrapers")
+    try:
+        logger.info("Cleaning up scraper resources")
+        close_shared_driver_pool()
+    except Exception as e:
+        logger.error(f"Error during scraper cleanup: {str(e)}")
 
 if __name__ == "__main__":
     try:
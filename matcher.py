@@ -1,8 +1,162 @@
-from typing import List, Dict
-from models import SearchCriteria, PropertyListing, MatchResult
+from typing import List, Dict, Optional, Sequence, Tuple, Iterator, Iterable, FrozenSet, Mapping, NamedTuple, Union
+from collections import OrderedDict
+from types import MappingProxyType
+from itertools import islice
+import heapq
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from datetime import datetime
+from models import SearchCriteria, MatchResult, ListingRecord
+from listing_index import ListingIndex
+from locality import locality_index
+from features import encode_features, popcount
+
+def _optional_column(values: List[Optional[float]]) -> np.ndarray:
+    """Build a float column where missing values are stored as NaN"""
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+class ListingBatch:
+    """
+    Columnar view of a set of listings, loaded once and scored many times
+    Accepts ListingRecord rows or scraped listing dictionaries
+    """
+    def __init__(self, listings: Iterable[Union[ListingRecord, Dict]]):
+        self.records: List[ListingRecord] = [
+            listing if isinstance(listing, ListingRecord) else ListingRecord.from_dict(listing)
+            for listing in listings
+        ]
+        records = self.records
+        self.price = np.array([record.price for record in records], dtype=float)
+        self.rooms = _optional_column([record.rooms for record in records])
+        self.size = _optional_column([record.size for record in records])
+        self.location = np.array([record.location.lower() for record in records], dtype=str)
+
+        # One boolean column per locality the listing addresses resolve to
+        self.localities: Dict[int, np.ndarray] = {}
+        for row, record in enumerate(records):
+            for locality_id in locality_index.resolve(record.location):
+                if locality_id not in self.localities:
+                    self.localities[locality_id] = np.zeros(len(records), dtype=bool)
+                self.localities[locality_id][row] = True
+
+        # Features as one bitmask per row over the fixed vocabulary
+        self.has_features = np.array([bool(record.features) for record in records], dtype=bool)
+        self.feature_mask = np.array([record.feature_mask for record in records], dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    # Columns written by save_columns, records stay with the process that owns the batch
+    COLUMNS = ('price', 'rooms', 'size', 'location', 'has_features', 'feature_mask')
+
+    def save_columns(self, directory: str):
+        """Write the scoring columns as .npy files that other processes can memory-map"""
+        for name in self.COLUMNS:
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self, name))
+        locality_ids = np.array(sorted(self.localities), dtype=np.int64)
+        np.save(os.path.join(directory, 'locality_ids.npy'), locality_ids)
+        if len(locality_ids):
+            locality_matrix = np.stack([self.localities[locality_id] for locality_id in locality_ids.tolist()])
+        else:
+            locality_matrix = np.zeros((0, len(self)), dtype=bool)
+        np.save(os.path.join(directory, 'localities.npy'), locality_matrix)
+
+    @classmethod
+    def load_columns(cls, directory: str) -> 'ListingBatch':
+        """Memory-map the columns written by save_columns, without the records"""
+        batch = cls.__new__(cls)
+        batch.records = []
+        for name in cls.COLUMNS:
+            setattr(batch, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+        locality_ids = np.load(os.path.join(directory, 'locality_ids.npy'))
+        locality_matrix = np.load(os.path.join(directory, 'localities.npy'), mmap_mode='r')
+        batch.localities = {
+            locality_id: locality_matrix[row] for row, locality_id in enumerate(locality_ids.tolist())
+        }
+        return batch
+
+    def take(self, rows: Sequence[int]) -> 'ListingBatch':
+        """Build a new batch holding only the given rows"""
+        rows = np.asarray(rows, dtype=int)
+        batch = ListingBatch.__new__(ListingBatch)
+        batch.records = [self.records[row] for row in rows.tolist()]
+        batch.price = self.price[rows]
+        batch.rooms = self.rooms[rows]
+        batch.size = self.size[rows]
+        batch.location = self.location[rows]
+        batch.localities = {locality_id: column[rows] for locality_id, column in self.localities.items()}
+        batch.has_features = self.has_features[rows]
+        batch.feature_mask = self.feature_mask[rows]
+        return batch
+
+    def locality_column(self, locality_id: int) -> np.ndarray:
+        """Get the boolean membership column for a locality"""
+        column = self.localities.get(locality_id)
+        if column is None:
+            return np.zeros(len(self), dtype=bool)
+        return column
+
+class ScoreMatrix:
+    """
+    Sparse profiles-by-listings score matrix stored as (profile, listing, score) triples
+    """
+    def __init__(self, profiles: np.ndarray, listings: np.ndarray, scores: np.ndarray, shape: Tuple[int, int]):
+        self.profiles = profiles
+        self.listings = listings
+        self.scores = scores
+        self.shape = shape
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, float]]:
+        return zip(self.profiles.tolist(), self.listings.tolist(), self.scores.tolist())
+
+    def by_profile(self) -> Dict[int, List[Tuple[int, float]]]:
+        """Group the (listing, score) entries under their profile row"""
+        grouped: Dict[int, List[Tuple[int, float]]] = {}
+        for profile, listing, score in self:
+            grouped.setdefault(profile, []).append((listing, score))
+        return grouped
+
+class ScoringPlan(NamedTuple):
+    """
+    Search criteria compiled once into everything the scoring needs
+    Range fields hold (low, high) bounds, or None when the check is inactive
+    Locations that resolve to no known locality are matched as a substring instead
+    """
+    location: str
+    localities: FrozenSet[int]
+    price: Optional[Tuple[float, float]]
+    rooms: Optional[Tuple[float, float]]
+    size: Optional[Tuple[float, float]]
+    feature_mask: int
+    feature_count: int
+    ranges: Tuple[Tuple[str, float, float, float], ...]
+    weights: Mapping[str, float]
+    best_score: float
+
+# Per-process state of the matching workers, set up by _init_worker
+_worker_matcher = None
+_worker_batch = None
+
+def _init_worker(weights: Dict[str, float], directory: str):
+    """Attach a worker process to the memory-mapped listing batch"""
+    global _worker_matcher, _worker_batch
+    _worker_matcher = PropertyMatcher()
+    _worker_matcher.criteria_weights = dict(weights)
+    _worker_batch = ListingBatch.load_columns(directory)
+
+def _match_shard(criteria_list: List[SearchCriteria], min_score: float):
+    """Score one shard of profiles in a worker process"""
+    scores = _worker_matcher.match_profiles(criteria_list, _worker_batch, min_score, workers=1)
+    return scores.profiles, scores.listings, scores.scores
 
 class PropertyMatcher:
-    def __init__(self):
+    def __init__(self, plan_cache_size: int = 1024, workers: int = 1):
         self.criteria_weights = {
             'price': 0.3,
             'location': 0.25,
@@ -10,73 +164,412 @@ class PropertyMatcher:
             'size': 0.15,
             'features': 0.1
         }
+        self.plan_cache_size = plan_cache_size
+        self.workers = workers
+        self._plan_cache: 'OrderedDict[tuple, ScoringPlan]' = OrderedDict()
+        self._plan_lock = threading.Lock()
+
+    def compile(self, criteria: SearchCriteria) -> ScoringPlan:
+        """
+        Compile search criteria into a scoring plan
+        Plans are kept in an LRU cache so repeated criteria skip the setup work
+        """
+        key = self._plan_key(criteria)
+        with self._plan_lock:
+            plan = self._plan_cache.get(key)
+            if plan is not None:
+                self._plan_cache.move_to_end(key)
+                return plan
+
+        weights = MappingProxyType(dict(self.criteria_weights))
+
+        def bounds(low: Optional[float], high: Optional[float]) -> Optional[Tuple[float, float]]:
+            return (low, high) if low is not None and high is not None else None
+
+        price = bounds(criteria.min_price, criteria.max_price)
+        rooms = bounds(criteria.min_rooms, criteria.max_rooms)
+        size = bounds(criteria.min_size, criteria.max_size)
+        ranges = tuple(
+            (field, limits[0], limits[1], weights[field])
+            for field, limits in (('price', price), ('rooms', rooms), ('size', size))
+            if limits is not None
+        )
+
+        best_score = weights['location'] + sum(weight for _, _, _, weight in ranges)
+        if criteria.features:
+            best_score += weights['features']
+
+        plan = ScoringPlan(
+            location=criteria.location.lower(),
+            localities=locality_index.resolve(criteria.location),
+            price=price,
+            rooms=rooms,
+            size=size,
+            feature_mask=encode_features(criteria.features),
+            feature_count=len(criteria.features or ()),
+            ranges=ranges,
+            weights=weights,
+            best_score=best_score
+        )
+
+        with self._plan_lock:
+            self._plan_cache[key] = plan
+            if len(self._plan_cache) > self.plan_cache_size:
+                self._plan_cache.popitem(last=False)
+        return plan
+
+    def _plan_key(self, criteria: SearchCriteria) -> tuple:
+        """Canonical cache key for criteria, insensitive to location case and feature order"""
+        return (
+            criteria.location.lower(),
+            criteria.min_price, criteria.max_price,
+            criteria.min_rooms, criteria.max_rooms,
+            criteria.min_size, criteria.max_size,
+            tuple(sorted(criteria.features or ())),
+            tuple(self.criteria_weights.items())
+        )
 
     def match_listings(self, criteria: SearchCriteria, listings: List[Dict]) -> List[MatchResult]:
         """
         Match property listings against search criteria
         Returns sorted list of MatchResult objects with match scores
         """
+        return self.match_batch(criteria, ListingBatch(listings))
+
+    def score_batch(self, criteria: SearchCriteria, batch: ListingBatch) -> np.ndarray:
+        """
+        Score every listing of a batch at once
+        Returns an array of match scores in percent, aligned with the batch rows
+        """
+        raw_scores, _ = self._score_columns(self.compile(criteria), batch)
+        return self._to_percent(raw_scores)
+
+    def match_batch(self, criteria: SearchCriteria, batch: ListingBatch,
+                    rows: Optional[Sequence[int]] = None) -> List[MatchResult]:
+        """
+        Score a batch and build MatchResult objects for the requested rows only
+        All rows are returned when rows is None
+        """
+        if rows is not None:
+            batch = batch.take(rows)
+        raw_scores, checks = self._score_columns(self.compile(criteria), batch)
+        scores = self._to_percent(raw_scores)
+
         results = []
-        
-        for listing_dict in listings:
-            # Convert dictionary to PropertyListing
-            listing = PropertyListing(**listing_dict)
-            
-            match_score = 0
+        for row in range(len(batch)):
             matching_criteria = []
             missing_criteria = []
-            
-            # Price matching
-            if criteria.min_price is not None and criteria.max_price is not None:
-                if criteria.min_price <= listing.price <= criteria.max_price:
-                    match_score += self.criteria_weights['price']
-                    matching_criteria.append('price_range')
-                else:
-                    missing_criteria.append('price_range')
-            
-            # Location matching (simple contains check)
-            if criteria.location.lower() in listing.location.lower():
-                match_score += self.criteria_weights['location']
-                matching_criteria.append('location')
-            else:
-                missing_criteria.append('location')
-            
-            # Rooms matching
-            if listing.rooms is not None and criteria.min_rooms is not None and criteria.max_rooms is not None:
-                if criteria.min_rooms <= listing.rooms <= criteria.max_rooms:
-                    match_score += self.criteria_weights['rooms']
-                    matching_criteria.append('rooms')
-                else:
-                    missing_criteria.append('rooms')
-            
-            # Size matching
-            if listing.size is not None and criteria.min_size is not None and criteria.max_size is not None:
-                if criteria.min_size <= listing.size <= criteria.max_size:
-                    match_score += self.criteria_weights['size']
-                    matching_criteria.append('size')
-                else:
-                    missing_criteria.append('size')
-            
-            # Features matching
-            if criteria.features and listing.features:
-                matched_features = set(criteria.features) & set(listing.features)
-                if matched_features:
-                    feature_score = len(matched_features) / len(criteria.features)
-                    match_score += self.criteria_weights['features'] * feature_score
-                    matching_criteria.append('features')
-                else:
-                    missing_criteria.append('features')
-            
-            # Convert to percentage
-            match_score = round(match_score * 100, 2)
-            
-            # Create MatchResult
-            result = MatchResult(
-                listing=listing,
-                match_score=match_score,
+            for name, applies, matched in checks:
+                if applies[row]:
+                    if matched[row]:
+                        matching_criteria.append(name)
+                    else:
+                        missing_criteria.append(name)
+
+            results.append(MatchResult(
+                listing=batch.records[row].to_listing(),
+                match_score=float(scores[row]),
                 matching_criteria=matching_criteria,
                 missing_criteria=missing_criteria
-            )
-            results.append(result)
-        
-        return results
\ No newline at end of file
+            ))
+
+        return results
+
+    def candidate_rows(self, criteria: SearchCriteria, index: ListingIndex, min_score: float,
+                       since: Optional[datetime] = None) -> np.ndarray:
+        """
+        Find the index rows that can still reach min_score for the given criteria
+        Rows whose best possible score falls short are skipped without scoring them
+        """
+        plan = self.compile(criteria)
+        floor = self._score_floor(min_score)
+
+        # Ranges the score cannot do without are answered from the sorted columns
+        rows = None
+        for field, low, high, weight in plan.ranges:
+            if plan.best_score - weight < floor:
+                in_range = index.range_rows(field, low, high)
+                rows = in_range if rows is None else np.intersect1d(rows, in_range, assume_unique=True)
+        if rows is None:
+            rows = index.live_rows()
+        if since is not None:
+            rows = index.rows_since(rows, since)
+
+        # Drop rows whose missed ranges already cost too much
+        columns = {field: index.column(field)[rows] for field, _, _, _ in plan.ranges}
+        upper_bound = self._range_upper_bound(plan, columns, len(rows))
+        return rows[upper_bound >= floor]
+
+    def hard_bounds(self, criteria: SearchCriteria, min_score: float) -> Dict:
+        """
+        Conditions every listing must meet to reach min_score for the criteria
+        Returned as keyword arguments for Database.get_candidate_listings
+        """
+        plan = self.compile(criteria)
+        floor = self._score_floor(min_score)
+        bounds = {}
+        for field, low, high, weight in plan.ranges:
+            if plan.best_score - weight < floor:
+                bounds[f'min_{field}'] = low
+                bounds[f'max_{field}'] = high
+
+        if plan.best_score - plan.weights['location'] < floor:
+            if plan.localities:
+                bounds['localities'] = plan.localities
+            elif plan.location.isascii():
+                # SQL lower() only folds ASCII, so other terms are checked in Python
+                bounds['location_contains'] = plan.location
+        return bounds
+
+    def iter_matches(self, criteria: SearchCriteria, listings: Iterable[Dict],
+                     min_score: float = 0.0, chunk_size: int = 512) -> Iterator[MatchResult]:
+        """
+        Stream the MatchResult of every listing scoring at least min_score, in input order
+        Listings are consumed chunk by chunk so memory stays bounded by the chunk size
+        """
+        plan = self.compile(criteria)
+        iterator = iter(listings)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            batch = self._prune(plan, ListingBatch(chunk), min_score)
+            scores = self.score_batch(criteria, batch)
+            yield from self.match_batch(criteria, batch, np.flatnonzero(scores >= min_score))
+
+    def top_matches(self, criteria: SearchCriteria, listings: Iterable[Dict], top_k: Optional[int] = None,
+                    min_score: float = 0.0, chunk_size: int = 512) -> List[MatchResult]:
+        """
+        Get the best matches scoring at least min_score, sorted by descending score
+        Only the top_k best listings are kept while streaming, all of them when top_k is None
+        """
+        if top_k is not None and top_k <= 0:
+            return []
+
+        plan = self.compile(criteria)
+        heap: List[Tuple[float, int, ListingRecord]] = []
+        seen = 0
+        iterator = iter(listings)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                break
+
+            # Once the heap is full the cutoff rises to its weakest entry
+            cutoff = min_score
+            if top_k is not None and len(heap) >= top_k:
+                cutoff = max(cutoff, heap[0][0])
+
+            batch = self._prune(plan, ListingBatch(chunk), cutoff)
+            scores = self.score_batch(criteria, batch)
+            for record, score in zip(batch.records, scores.tolist()):
+                seen += 1
+                if score < min_score:
+                    continue
+                # Later listings lose ties so the order matches a stable sort
+                entry = (score, -seen, record)
+                if top_k is None or len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+        heap.sort(reverse=True)
+        return self.match_batch(criteria, ListingBatch([record for _, _, record in heap]))
+
+    def match_profiles(self, criteria_list: List[SearchCriteria], batch: ListingBatch,
+                       min_score: float = 0.0, workers: Optional[int] = None) -> ScoreMatrix:
+        """
+        Score many search profiles against one listing batch in a single pass
+        Returns a sparse matrix with every (profile, listing) pair scoring above zero and at least min_score
+        Profiles are sharded over a process pool when more than one worker is configured
+        """
+        profile_count = len(criteria_list)
+        listing_count = len(batch)
+        shape = (profile_count, listing_count)
+        if not profile_count or not listing_count:
+            return ScoreMatrix(np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=float), shape)
+
+        workers = self.workers if workers is None else workers
+        if workers > 1 and profile_count > workers:
+            return self._match_profiles_parallel(criteria_list, batch, min_score, workers)
+
+        plans = [self.compile(criteria) for criteria in criteria_list]
+
+        # Per-profile criteria as columns, NaN bounds mark an inactive range
+        def bounds(field: str):
+            limits = np.array([getattr(plan, field) or (np.nan, np.nan) for plan in plans], dtype=float)
+            return limits[:, 0], limits[:, 1], ~np.isnan(limits[:, 0])
+
+        min_price, max_price, has_price = bounds('price')
+        min_rooms, max_rooms, has_rooms = bounds('rooms')
+        min_size, max_size, has_size = bounds('size')
+
+        # Location columns are computed once per distinct search location
+        needles = [plan.localities or plan.location for plan in plans]
+        needle_rows = {needle: row for row, needle in enumerate(dict.fromkeys(needles))}
+        location_plans = {plan.localities or plan.location: plan for plan in plans}
+        location_matrix = np.stack([self._match_location(location_plans[needle], batch) for needle in needle_rows])
+        needle_index = np.array([needle_rows[needle] for needle in needles], dtype=int)
+
+        # Feature overlap is the popcount of the AND of profile and listing masks
+        wanted = np.array([plan.feature_mask for plan in plans], dtype=np.uint64)
+        feature_totals = np.array([plan.feature_count for plan in plans], dtype=float)
+        has_feature_criteria = feature_totals > 0
+        safe_totals = np.where(has_feature_criteria, feature_totals, 1.0)
+
+        rooms_known = ~np.isnan(batch.rooms)
+        size_known = ~np.isnan(batch.size)
+        weights = plans[0].weights
+
+        profile_parts, listing_parts, score_parts = [], [], []
+        chunk = max(1, (1 << 22) // listing_count)
+        for start in range(0, profile_count, chunk):
+            rows = slice(start, start + chunk)
+
+            # Same addition order as _score_columns so the sums stay identical
+            raw_scores = np.zeros((len(needle_index[rows]), listing_count), dtype=float)
+
+            matched = has_price[rows, None] & (min_price[rows, None] <= batch.price) & (batch.price <= max_price[rows, None])
+            raw_scores += np.where(matched, weights['price'], 0.0)
+
+            matched = location_matrix[needle_index[rows]]
+            raw_scores += np.where(matched, weights['location'], 0.0)
+
+            matched = (has_rooms[rows, None] & rooms_known
+                       & (min_rooms[rows, None] <= batch.rooms) & (batch.rooms <= max_rooms[rows, None]))
+            raw_scores += np.where(matched, weights['rooms'], 0.0)
+
+            matched = (has_size[rows, None] & size_known
+                       & (min_size[rows, None] <= batch.size) & (batch.size <= max_size[rows, None]))
+            raw_scores += np.where(matched, weights['size'], 0.0)
+
+            matched_count = popcount(wanted[rows, None] & batch.feature_mask)
+            matched = has_feature_criteria[rows, None] & batch.has_features & (matched_count > 0)
+            raw_scores += np.where(matched, weights['features'] * (matched_count / safe_totals[rows, None]), 0.0)
+
+            # Rounding moves a score by at most 0.005, so this keeps every qualifying pair
+            profile_rows, listing_rows = np.nonzero((raw_scores > 0) & (raw_scores * 100 >= min_score - 0.01))
+            scores = self._to_percent(raw_scores[profile_rows, listing_rows])
+            keep = scores >= min_score
+            profile_parts.append(profile_rows[keep] + start)
+            listing_parts.append(listing_rows[keep])
+            score_parts.append(scores[keep])
+
+        return ScoreMatrix(np.concatenate(profile_parts), np.concatenate(listing_parts),
+                           np.concatenate(score_parts), shape)
+
+    def _match_profiles_parallel(self, criteria_list: List[SearchCriteria], batch: ListingBatch,
+                                 min_score: float, workers: int) -> ScoreMatrix:
+        """Shard profiles over worker processes that memory-map one copy of the batch columns"""
+        shard_size = -(-len(criteria_list) // (workers * 4))
+        shards = [criteria_list[start:start + shard_size] for start in range(0, len(criteria_list), shard_size)]
+
+        # Prefer RAM-backed storage so the mapped pages never touch the disk
+        shared_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        with tempfile.TemporaryDirectory(dir=shared_dir) as directory:
+            batch.save_columns(directory)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.criteria_weights, directory)) as pool:
+                # map keeps shard order, so the merged matrix is the same as a serial run
+                results = list(pool.map(_match_shard, shards, [min_score] * len(shards)))
+
+        profile_parts, listing_parts, score_parts = [], [], []
+        for shard_index, (profiles, listings, scores) in enumerate(results):
+            profile_parts.append(profiles + shard_index * shard_size)
+            listing_parts.append(listings)
+            score_parts.append(scores)
+
+        return ScoreMatrix(np.concatenate(profile_parts), np.concatenate(listing_parts),
+                           np.concatenate(score_parts), (len(criteria_list), len(batch)))
+
+    def _prune(self, plan: ScoringPlan, batch: ListingBatch, min_score: float) -> ListingBatch:
+        """Drop the rows of a batch that cannot reach min_score, using only cheap checks"""
+        columns = {field: getattr(batch, field) for field, _, _, _ in plan.ranges}
+        upper_bound = self._range_upper_bound(plan, columns, len(batch))
+        if plan.feature_count:
+            upper_bound -= np.where(batch.has_features, 0.0, plan.weights['features'])
+        return batch.take(np.flatnonzero(upper_bound >= self._score_floor(min_score)))
+
+    @staticmethod
+    def _range_upper_bound(plan: ScoringPlan, columns: Dict[str, np.ndarray], count: int) -> np.ndarray:
+        """Best reachable raw score of each row once its missed ranges are taken off"""
+        upper_bound = np.full(count, plan.best_score)
+        for field, low, high, weight in plan.ranges:
+            values = columns[field]
+            upper_bound -= np.where((low <= values) & (values <= high), 0.0, weight)
+        return upper_bound
+
+    @staticmethod
+    def _score_floor(min_score: float) -> float:
+        """Raw score below which a listing cannot round up to min_score"""
+        # Leave room for the rounding to two decimals of the final score
+        return (min_score - 0.01) / 100
+
+    def _score_columns(self, plan: ScoringPlan, batch: ListingBatch):
+        """
+        Compute the weighted score of every row as array operations
+        Returns the raw scores and the (name, applies, matched) mask of each criterion
+        """
+        count = len(batch)
+        weights = plan.weights
+        raw_scores = np.zeros(count, dtype=float)
+        checks = []
+
+        # Contributions are added in the same order as the per-listing scoring
+        # so the floating point sums stay bit-for-bit identical
+        if plan.price is not None:
+            min_price, max_price = plan.price
+            matched = (min_price <= batch.price) & (batch.price <= max_price)
+            raw_scores += np.where(matched, weights['price'], 0.0)
+            checks.append(('price_range', np.ones(count, dtype=bool), matched))
+
+        matched = self._match_location(plan, batch)
+        raw_scores += np.where(matched, weights['location'], 0.0)
+        checks.append(('location', np.ones(count, dtype=bool), matched))
+
+        if plan.rooms is not None:
+            min_rooms, max_rooms = plan.rooms
+            applies = ~np.isnan(batch.rooms)
+            matched = applies & (min_rooms <= batch.rooms) & (batch.rooms <= max_rooms)
+            raw_scores += np.where(matched, weights['rooms'], 0.0)
+            checks.append(('rooms', applies, matched))
+
+        if plan.size is not None:
+            min_size, max_size = plan.size
+            applies = ~np.isnan(batch.size)
+            matched = applies & (min_size <= batch.size) & (batch.size <= max_size)
+            raw_scores += np.where(matched, weights['size'], 0.0)
+            checks.append(('size', applies, matched))
+
+        if plan.feature_count:
+            matched_count = popcount(batch.feature_mask & np.uint64(plan.feature_mask))
+            applies = batch.has_features
+            matched = applies & (matched_count > 0)
+            feature_score = matched_count / plan.feature_count
+            raw_scores += np.where(matched, weights['features'] * feature_score, 0.0)
+            checks.append(('features', applies, matched))
+
+        return raw_scores, checks
+
+    @staticmethod
+    def _match_location(plan: ScoringPlan, batch: ListingBatch) -> np.ndarray:
+        """Check which rows are in one of the searched localities"""
+        if not plan.localities:
+            # Unknown places fall back to a simple contains check
+            return np.char.find(batch.location, plan.location) >= 0
+        matched = np.zeros(len(batch), dtype=bool)
+        for locality_id in plan.localities:
+            matched |= batch.locality_column(locality_id)
+        return matched
+
+    @staticmethod
+    def _to_percent(raw_scores: np.ndarray) -> np.ndarray:
+        """Convert raw scores to percentages rounded like the builtin round()"""
+        percent = raw_scores * 100
+        rounded = np.round(percent, 2)
+        # np.round can differ from round() only next to a halfway point, those few go through the builtin
+        scaled = percent * 100
+        halfway = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+        for i in halfway.tolist():
+            rounded[i] = round(float(percent[i]), 2)
+        return rounded
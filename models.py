@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
+from features import encode_features
 
 class SearchCriteria(BaseModel):
     location: str
@@ -27,4 +28,61 @@ class MatchResult(BaseModel):
     listing: PropertyListing
     match_score: float
     matching_criteria: List[str]
-    missing_criteria: List[str]
\ No newline at end of file
+    missing_criteria: List[str]
+
+class ListingRecord:
+    """
+    Compact listing row used by the matcher and the in-memory indexes
+    Filled straight from scraper dicts or database rows, without pydantic validation
+    """
+    __slots__ = ('title', 'price', 'location', 'rooms', 'size', 'features', 'feature_mask',
+                 'link', 'source', 'created_at')
+
+    def __init__(self, title: str, price: float, location: str, rooms: Optional[float], size: Optional[float],
+                 features: Optional[List[str]], feature_mask: int, link: str, source: str,
+                 created_at: Optional[datetime]):
+        self.title = title
+        self.price = price
+        self.location = location
+        self.rooms = rooms
+        self.size = size
+        self.features = features
+        self.feature_mask = feature_mask
+        self.link = link
+        self.source = source
+        self.created_at = created_at
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ListingRecord':
+        """Create a record from a scraped listing dictionary"""
+        feature_mask = data.get('feature_mask')
+        if feature_mask is None:
+            feature_mask = encode_features(data.get('features'))
+        return cls(
+            title=data['title'],
+            price=float(data['price']),
+            location=data['location'],
+            rooms=data.get('rooms'),
+            size=data.get('size'),
+            features=data.get('features'),
+            feature_mask=feature_mask,
+            link=data['link'],
+            source=data['source'],
+            created_at=data.get('created_at')
+        )
+
+    def to_listing(self) -> PropertyListing:
+        """Build the validated API model for this record"""
+        data = {
+            "title": self.title,
+            "price": self.price,
+            "location": self.location,
+            "rooms": self.rooms,
+            "size": self.size,
+            "features": self.features,
+            "link": self.link,
+            "source": self.source
+        }
+        if self.created_at is not None:
+            data["created_at"] = self.created_at
+        return PropertyListing(**data)
@@ -0,0 +1,127 @@
+from typing import Dict, List, Set, Tuple
+import numpy as np
+from models import SearchCriteria, ListingRecord
+from matcher import PropertyMatcher, ScoringPlan
+from locality import locality_index
+from features import popcount
+
+class ProfilePercolator:
+    """
+    Reverse matcher: holds every saved profile in memory and finds the ones a single listing matches
+
+    Profiles are filed under the localities they search for, and their range
+    bounds, feature masks and weights are kept as columns so one listing is
+    scored against all of them with a handful of array operations.
+    """
+    def __init__(self, matcher: PropertyMatcher):
+        self.matcher = matcher
+        self.profile_ids: List[int] = []
+        self.plans: List[ScoringPlan] = []
+        self.rows: Dict[int, int] = {}
+        self.by_locality: Dict[int, Set[int]] = {}
+        self.by_substring: Dict[str, Set[int]] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._grow(64)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, profile_id: int, criteria: SearchCriteria):
+        """Register a profile, replacing any previous criteria stored for it"""
+        self.remove(profile_id)
+        plan = self.matcher.compile(criteria)
+
+        row = len(self.profile_ids)
+        if row == len(self._live):
+            self._grow(2 * row)
+        for field in ('price', 'rooms', 'size'):
+            low, high = getattr(plan, field) or (np.nan, np.nan)
+            self._columns[f'min_{field}'][row] = low
+            self._columns[f'max_{field}'][row] = high
+        self._columns['feature_mask'][row] = plan.feature_mask
+        self._columns['feature_count'][row] = plan.feature_count
+        self._live[row] = True
+
+        if plan.localities:
+            for locality_id in plan.localities:
+                self.by_locality.setdefault(locality_id, set()).add(row)
+        else:
+            self.by_substring.setdefault(plan.location, set()).add(row)
+
+        self.profile_ids.append(profile_id)
+        self.plans.append(plan)
+        self.rows[profile_id] = row
+
+    def remove(self, profile_id: int):
+        """Forget a profile"""
+        row = self.rows.pop(profile_id, None)
+        if row is None:
+            return
+        self._live[row] = False
+        for rows in list(self.by_locality.values()) + list(self.by_substring.values()):
+            rows.discard(row)
+
+    def match(self, record: ListingRecord, min_score: float) -> List[Tuple[int, float]]:
+        """
+        Find the profiles a listing scores at least min_score for
+        Returns (profile_id, score) pairs, scores computed exactly like PropertyMatcher
+        """
+        count = len(self.profile_ids)
+        if not self.rows:
+            return []
+        columns = {field: column[:count] for field, column in self._columns.items()}
+        weights = self.matcher.criteria_weights
+
+        # Profiles filed under one of the listing's localities, or whose search term it contains
+        location_matched = np.zeros(count, dtype=bool)
+        for locality_id in locality_index.resolve(record.location):
+            location_matched[list(self.by_locality.get(locality_id, ()))] = True
+        listing_location = record.location.lower()
+        for needle, rows in self.by_substring.items():
+            if needle in listing_location:
+                location_matched[list(rows)] = True
+
+        # Same addition order as PropertyMatcher._score_columns so the sums stay identical
+        raw_scores = np.zeros(count, dtype=float)
+        matched = (columns['min_price'] <= record.price) & (record.price <= columns['max_price'])
+        raw_scores += np.where(matched, weights['price'], 0.0)
+
+        raw_scores += np.where(location_matched, weights['location'], 0.0)
+
+        for field in ('rooms', 'size'):
+            value = getattr(record, field)
+            if value is None:
+                continue
+            matched = (columns[f'min_{field}'] <= value) & (value <= columns[f'max_{field}'])
+            raw_scores += np.where(matched, weights[field], 0.0)
+
+        if record.features:
+            matched_count = popcount(columns['feature_mask'] & np.uint64(record.feature_mask))
+            totals = columns['feature_count']
+            matched = (totals > 0) & (matched_count > 0)
+            raw_scores += np.where(matched, weights['features'] * (matched_count / np.maximum(totals, 1)), 0.0)
+
+        # Rounding moves a score by at most 0.005, so this keeps every qualifying profile
+        rows = np.flatnonzero(self._live[:count] & (raw_scores * 100 >= min_score - 0.01))
+        scores = self.matcher._to_percent(raw_scores[rows])
+        return [
+            (self.profile_ids[row], score)
+            for row, score in zip(rows.tolist(), scores.tolist())
+            if score >= min_score
+        ]
+
+    def _grow(self, capacity: int):
+        """Resize the profile columns to the given capacity"""
+        def resized(column: np.ndarray, dtype, fill) -> np.ndarray:
+            grown = np.full(capacity, fill, dtype=dtype)
+            grown[:len(column)] = column
+            return grown
+
+        for field in ('price', 'rooms', 'size'):
+            for bound in ('min', 'max'):
+                name = f'{bound}_{field}'
+                self._columns[name] = resized(self._columns.get(name, np.zeros(0)), float, np.nan)
+        self._columns['feature_mask'] = resized(self._columns.get('feature_mask', np.zeros(0)), np.uint64, 0)
+        self._columns['feature_count'] = resized(self._columns.get('feature_count', np.zeros(0)), np.int64, 0)
+        self._live = resized(self._live, bool, False)
@@ -1,20 +1,36 @@
 import schedule
 import time
 from datetime import datetime, timedelta
-from database import Database
-from matcher import PropertyMatcher
+from database import Database, ListingChange, SearchProfile, profile_cursor_name
+from matcher import PropertyMatcher, ListingBatch
+from percolator import ProfilePercolator
+from models import SearchCriteria, ListingRecord
 from email_notifier import EmailNotifier
 from scrapers.flatfox_scraper import FlatfoxScraper
 from scrapers.homegate_scraper import HomegateScraper
 from scrapers.immoscout_scraper import ImmoscoutScraper
+from scrapers.base_scraper import warm_shared_driver_pool
 import json
+import os
 import threading
 
+# Change log cursor of the realtime alerts
+REALTIME_CURSOR = 'realtime'
+
 class MatchingScheduler:
     def __init__(self):
         self.db = Database()
-        self.matcher = PropertyMatcher()
+        # Profiles are scored on several cores when MATCHING_WORKERS > 1
+        self.matcher = PropertyMatcher(workers=int(os.getenv("MATCHING_WORKERS", "1")))
         self.notifier = EmailNotifier()
+        self.match_threshold = 70
+        # The in-memory listing index trades memory for fewer queries, LISTING_INDEX=0 reads listings from SQL
+        self.use_listing_index = os.getenv("LISTING_INDEX", "1") == "1"
+        self.percolator = ProfilePercolator(self.matcher)
+        self.started_at = datetime.now()
+        # Listings missing from scrapes for this long are stale, and archived once stale this long
+        self.stale_after = timedelta(hours=int(os.getenv("LISTING_STALE_HOURS", "48")))
+        self.archive_after = timedelta(days=int(os.getenv("LISTING_ARCHIVE_DAYS", "30")))
         self.scrapers = {
             'flatfox': FlatfoxScraper(),
             'homegate': HomegateScraper(),
@@ -23,61 +39,185 @@ class MatchingScheduler:
 
     def run_matching(self, frequency: str):
         """Run matching for profiles with given notification frequency"""
-        profiles = self.db.get_search_profiles(frequency)
-        
-        for profile in profiles:
+        profiles = []
+        for profile in self.db.get_search_profiles(frequency):
             # Skip if notification was sent too recently
             if profile.last_notification:
                 if frequency == 'hourly' and datetime.now() - profile.last_notification < timedelta(hours=1):
                     continue
                 elif frequency == 'daily' and datetime.now() - profile.last_notification < timedelta(days=1):
                     continue
-            
-            # Get new listings since last notification
-            new_listings = self.db.get_new_listings(
-                profile.last_notification or datetime.now() - timedelta(days=7)
-            )
-            
-            # Match listings against criteria
-            criteria = json.loads(profile.criteria)
-            matches = self.matcher.match_listings(criteria, new_listings)
-            
-            # Filter matches with score above threshold (e.g., 70%)
-            good_matches = [match for match in matches if match.match_score >= 70]
-            
-            if good_matches:
-                # Send email notification
-                self.notifier.send_matches_notification(profile.user_email, good_matches)
-                # Update notification time
-                self.db.update_notification_time(profile.id)
+            profiles.append(profile)
+
+        if not profiles:
+            return
+
+        # Each profile reads the change log through its own cursor, so profiles skipped above keep
+        # their position until they are due. Profiles without a cursor yet start at their last
+        # notification, or a week back, and are matched on their own so their backlog is not
+        # scored against every other profile.
+        cursors = self.db.get_cursors(profile_cursor_name(profile.id) for profile in profiles)
+        known = [profile for profile in profiles if profile_cursor_name(profile.id) in cursors]
+        new = [profile for profile in profiles if profile_cursor_name(profile.id) not in cursors]
+        if known:
+            self._match_profiles(known, [cursors[profile_cursor_name(profile.id)] for profile in known])
+        if new:
+            self._match_profiles(new, [
+                self.db.get_cursor(profile_cursor_name(profile.id),
+                                   since=profile.last_notification or datetime.now() - timedelta(days=7))
+                for profile in new
+            ])
+
+    def _match_profiles(self, profiles: list, positions: list):
+        """Notify profiles of the listings changed past their cursor positions, then advance the cursors"""
+        cursor_names = [profile_cursor_name(profile.id) for profile in profiles]
+
+        # Changes since the oldest position are scored once, each profile keeps those past its own
+        changes = self.db.get_changes(min(positions))
+        if not changes:
+            return
+        changed_by = {}
+        for change in changes:
+            if change.event == 'removed':
+                changed_by.pop(change.external_id, None)
+            elif self._is_news(change):
+                changed_by[change.external_id] = change.id
+
+        changed = self._listing_records(changed_by)
+        change_ids = [changed_by[external_id] for external_id in changed]
+        batch = ListingBatch(list(changed.values()))
+
+        criteria = [SearchCriteria(**json.loads(profile.criteria)) for profile in profiles]
+
+        # Score all profiles against the batch in a single pass
+        scores = self.matcher.match_profiles(criteria, batch, min_score=self.match_threshold)
+
+        notified = []
+        for row, entries in scores.by_profile().items():
+            profile = profiles[row]
+            rows = [listing_row for listing_row, _ in entries if change_ids[listing_row] > positions[row]]
+            if not rows:
+                continue
+
+            good_matches = self.matcher.match_batch(criteria[row], batch, rows)
+
+            # Send email notification
+            self.notifier.send_matches_notification(profile.user_email, good_matches)
+            notified.append(profile.id)
+
+        # Notification times and cursors are written once for the whole run
+        self.db.update_notification_times(notified)
+        self.db.save_cursors({name: changes[-1].id for name in cursor_names})
+
+    @staticmethod
+    def _is_news(change: ListingChange) -> bool:
+        """Whether a change is worth telling profiles about: a new listing or a price drop"""
+        if change.event == 'new':
+            return True
+        return (change.event == 'price_changed' and change.previous_price is not None
+                and change.price < change.previous_price)
+
+    def _listing_records(self, external_ids) -> dict:
+        """Get the current records of the given listings keyed by external_id"""
+        if self.use_listing_index:
+            index = self.db.get_listing_index()
+            return {
+                external_id: index.records[index.rows[external_id]]
+                for external_id in external_ids if external_id in index.rows
+            }
+        return self.db.get_listing_records(external_ids)
+
+    def load_realtime_profiles(self):
+        """Rebuild the percolator from the saved realtime profiles"""
+        percolator = ProfilePercolator(self.matcher)
+        for profile in self.db.get_search_profiles('realtime'):
+            percolator.add(profile.id, SearchCriteria(**json.loads(profile.criteria)))
+        self.percolator = percolator
+
+    def run_realtime(self):
+        """
+        Send realtime alerts for the listings logged as new since the previous call
+        Reading them from the change log covers every ingest path, the scrapers here as well as the API's searches
+        """
+        # A new cursor starts with the listings logged since the scheduler started, older ones get no alert
+        position = self.db.get_cursor(REALTIME_CURSOR, since=self.started_at)
+        changes = self.db.get_changes(position)
+        if not changes:
+            return
+        new = [change.external_id for change in changes if change.event == 'new']
+        for record in self._listing_records(new).values():
+            self.notify_realtime(record)
+        self.db.save_cursor(REALTIME_CURSOR, changes[-1].id)
+
+    def notify_realtime(self, record: ListingRecord):
+        """Send realtime alerts to the profiles a freshly ingested listing matches"""
+        matches = self.percolator.match(record, self.match_threshold)
+        if not matches:
+            return
+
+        batch = ListingBatch([record])
+        for profile_id, _ in matches:
+            profile = self.db.session.get(SearchProfile, profile_id)
+            if profile is None:
+                continue
+            criteria = SearchCriteria(**json.loads(profile.criteria))
+            self.notifier.send_matches_notification(profile.user_email, self.matcher.match_batch(criteria, batch))
+            self.db.update_notification_time(profile.id)
 
     def scrape_listings(self):
         """Scrape new listings from all sources"""
+        # Pick up realtime profiles created since the last cycle
+        self.load_realtime_profiles()
+
         for scraper_name, scraper in self.scrapers.items():
             try:
                 # Use empty criteria to get all listings
                 listings = scraper.scrape({})
                 
-                # Save to database
-                for listing in listings:
-                    self.db.add_listing(listing)
+                # Save to database in bulk
+                result = self.db.add_listings(listings)
+                print(f"{scraper_name}: {result.inserted} new, {result.updated} updated, "
+                      f"{result.unchanged} unchanged listings")
+
+                self.run_realtime()
                     
             except Exception as e:
                 print(f"Error scraping {scraper_name}: {e}")
-            finally:
-                scraper.cleanup()
+
+    def run_retention(self):
+        """Retire listings that went off-market and archive the old ones"""
+        stale = self.db.mark_stale_listings(self.stale_after)
+        archived = self.db.archive_listings(self.archive_after)
+        print(f"Retention: {stale} listings marked stale, {archived} archived")
+
+    def run_job(self, job, *args):
+        """Run a scheduled job as one unit of work on its own database session"""
+        with self.db.session_scope():
+            job(*args)
 
     def start(self):
         """Start the scheduling system"""
         # Schedule scraping every 30 minutes
-        schedule.every(30).minutes.do(self.scrape_listings)
+        schedule.every(30).minutes.do(self.run_job, self.scrape_listings)
         
         # Schedule matching
-        schedule.every().hour.at(":00").do(lambda: self.run_matching('hourly'))
-        schedule.every().day.at("09:00").do(lambda: self.run_matching('daily'))
+        schedule.every().hour.at(":00").do(self.run_job, self.run_matching, 'hourly')
+        schedule.every().day.at("09:00").do(self.run_job, self.run_matching, 'daily')
+
+        # Realtime alerts for listings the API ingested between scrapes
+        schedule.every().minute.do(self.run_job, self.run_realtime)
+
+        # Schedule retention, and compaction once the week's archived rows are gone
+        schedule.every().day.at("03:00").do(self.run_job, self.run_retention)
+        schedule.every().sunday.at("04:00").do(self.db.optimize)
+
+        # Refresh the listing snapshot other processes warm-start from
+        if self.db.snapshot_dir:
+            schedule.every().hour.do(self.run_job, self.db.save_listing_snapshot)
         
-        # Run initial scraping
-        self.scrape_listings()
+        # Run initial scraping, on browsers started ahead of it
+        warm_shared_driver_pool()
+        self.run_job(self.scrape_listings)
         
         # Start the scheduler
         while True:
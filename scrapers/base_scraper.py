@@ -1,84 +1,575 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import WebDriverException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException, TimeoutException, NoSuchElementException
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qs, urljoin, urlparse
+from urllib3.util.retry import Retry
+import math
+import re
+import requests
+import threading
 import time
 import os
+from locality import locality_index
+
+try:
+    import psutil
+except ImportError:  # memory ceilings are only enforced when psutil is installed
+    psutil = None
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Result counts printed above the listing cards, e.g. "1'234 résultats"
+RESULT_COUNT_PATTERN = re.compile(
+    r"(\d{1,3}(?:['’ ]?\d{3})*)\s+(?:résultats|annonces|objets|Treffer|Ergebnisse|Objekte|results|listings)\b",
+    re.IGNORECASE
+)
+
+# What results pages say when a search found nothing, e.g. "Aucun résultat" or "0 Treffer"
+NO_RESULTS_PATTERN = re.compile(
+    r"(?<![\d'’])(?:0|aucun|aucune|keine|no)\s+(?:résultats?|annonces?|objets?|Treffer|Ergebnisse?|Objekte|results?|listings?)\b",
+    re.IGNORECASE
+)
+
+# Browser-like headers so the sites serve the same HTML as to Chrome
+HTTP_HEADERS = {
+    "User-Agent": ("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "fr-CH,fr;q=0.9,de-CH;q=0.8,en;q=0.7",
+}
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+def http_session() -> requests.Session:
+    """Get the process-wide HTTP session, keeping connections to each site alive across scrapes"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            session.headers.update(HTTP_HEADERS)
+            retries = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=int(os.getenv("HTTP_POOL_SIZE", "16")),
+                                  max_retries=retries)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+class HtmlElement:
+    """
+    Parsed HTML node exposing the subset of the Selenium WebElement API the scrapers use
+    Lets the same _parse_listing read server-rendered pages and browser-rendered ones
+    """
+    _LOCATORS = {
+        By.CSS_SELECTOR: lambda value: value,
+        By.CLASS_NAME: lambda value: f".{value}",
+        By.TAG_NAME: lambda value: value,
+    }
+
+    def __init__(self, tag, base_url: str):
+        self.tag = tag
+        self.base_url = base_url
+
+    @property
+    def text(self) -> str:
+        return self.tag.get_text(" ", strip=True)
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        value = self.tag.get(name)
+        if isinstance(value, list):
+            value = " ".join(value)
+        # Like the browser, links come back absolute
+        if value is not None and name in ("href", "src"):
+            value = urljoin(self.base_url, value)
+        return value
+
+    def find_elements(self, by: str, value: str) -> List['HtmlElement']:
+        selector = self._LOCATORS[by](value)
+        return [HtmlElement(tag, self.base_url) for tag in self.tag.select(selector)]
+
+    def find_element(self, by: str, value: str) -> 'HtmlElement':
+        tag = self.tag.select_one(self._LOCATORS[by](value))
+        if tag is None:
+            raise NoSuchElementException(f"No element matches {value!r}")
+        return HtmlElement(tag, self.base_url)
+
+def create_driver(page_load_timeout: int = 30) -> webdriver.Chrome:
+    """Start a headless Chrome WebDriver with appropriate options"""
+    driver = None
+    try:
+        # Configure Chrome options
+        chrome_options = Options()
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument("--disable-notifications")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--disable-infobars")
+        chrome_options.add_argument("--disable-popup-blocking")
+        chrome_options.add_argument("--ignore-certificate-errors")
+        
+        # Add performance logging preferences
+        chrome_options.set_capability(
+            "goog:loggingPrefs",
+            {"performance": "ALL", "browser": "ALL"}
+        )
+        
+        # Set Chrome binary location
+        chrome_binary = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+        if os.path.exists(chrome_binary):
+            chrome_options.binary_location = chrome_binary
+        
+        # Create Service with specific chromedriver path
+        chromedriver_path = "/opt/homebrew/bin/chromedriver"
+        if not os.path.exists(chromedriver_path):
+            raise Exception(f"ChromeDriver not found at {chromedriver_path}")
+        
+        service = Service(executable_path=chromedriver_path)
+        
+        # Initialize Chrome WebDriver with the configured options
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.set_page_load_timeout(page_load_timeout)
+        # No implicit wait: readiness is waited for explicitly, and a missing optional field fails at once
+        driver.implicitly_wait(0)
+        
+        print("WebDriver initialized successfully")
+        return driver
+            
+    except Exception as e:
+        print(f"Error initializing WebDriver: {e}")
+        if driver:
+            try:
+                driver.quit()
+            except:
+                pass
+        raise
+
+class PooledDriver:
+    """A pooled browser and the usage it is recycled on"""
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.page_loads = 0
+        self.created_at = time.time()
+
+    def memory_mb(self) -> Optional[float]:
+        """Resident memory of chromedriver and the browser processes it started, None if unknown"""
+        if psutil is None:
+            return None
+        try:
+            process = psutil.Process(self.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(child.memory_info().rss for child in processes) / (1024 * 1024)
+        except (psutil.Error, AttributeError):
+            return None
+
+    def is_healthy(self) -> bool:
+        """Check that the browser still answers"""
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error quitting WebDriver: {e}")
+
+class DriverPool:
+    """
+    Fixed-size pool of headless browsers leased to one scrape at a time
+
+    Browsers are started ahead of use, checked before every lease and
+    replaced after max_page_loads page loads or once their processes use
+    more than max_memory_mb.
+    """
+    def __init__(self, size: int = None, warm: int = None, max_page_loads: int = None,
+                 max_memory_mb: float = None, page_load_timeout: int = 30):
+        self.size = size or int(os.getenv("DRIVER_POOL_SIZE", "2"))
+        self.max_page_loads = max_page_loads or int(os.getenv("DRIVER_MAX_PAGE_LOADS", "200"))
+        self.max_memory_mb = max_memory_mb or float(os.getenv("DRIVER_MAX_MEMORY_MB", "1500"))
+        self.page_load_timeout = page_load_timeout
+        self._idle: List[PooledDriver] = []
+        self._started = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        warm = min(self.size, warm if warm is not None else int(os.getenv("DRIVER_POOL_WARM", "1")))
+        for _ in range(warm):
+            self._started += 1
+            self._idle.append(self._start())
+
+    def _start(self) -> PooledDriver:
+        """Start a browser in a slot already counted against the pool size"""
+        try:
+            return PooledDriver(create_driver(self.page_load_timeout))
+        except Exception:
+            self._retire(None)
+            raise
+
+    def _retire(self, pooled: Optional[PooledDriver]):
+        """Quit a browser and free its slot"""
+        if pooled is not None:
+            pooled.quit()
+        with self._condition:
+            self._started -= 1
+            self._condition.notify()
+
+    def _needs_recycling(self, pooled: PooledDriver) -> bool:
+        if pooled.page_loads >= self.max_page_loads:
+            return True
+        memory = pooled.memory_mb()
+        return memory is not None and memory > self.max_memory_mb
+
+    def acquire(self, timeout: float = None) -> PooledDriver:
+        """Take a healthy browser, starting one if the pool has room, otherwise waiting for a return"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._started >= self.size:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No WebDriver available after {timeout}s")
+                    self._condition.wait(remaining)
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    pooled = None
+                    self._started += 1
+
+            if pooled is None:
+                return self._start()
+            if pooled.is_healthy():
+                return pooled
+            print("Replacing unresponsive WebDriver")
+            self._retire(pooled)
+
+    def release(self, pooled: PooledDriver):
+        """Give a browser back, recycling it if it is worn out"""
+        if self._closed or self._needs_recycling(pooled):
+            self._retire(pooled)
+            return
+        with self._condition:
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """Hold a browser for the duration of a with block"""
+        pooled = self.acquire(timeout)
+        try:
+            yield pooled
+        finally:
+            self.release(pooled)
+
+    def close(self):
+        """Quit the idle browsers, leased ones are quit when they are returned"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for pooled in idle:
+            self._retire(pooled)
+
+class ResultsStable:
+    """
+    Wait condition met once the results page has settled for a settle period: the listing cards are present
+    and their count no longer changes, or the page says the search found nothing
+    Returns the cards, or True for a page without results
+    """
+    def __init__(self, locator: Tuple[str, str], empty_locator: Tuple[str, str] = None, settle: float = 0.5):
+        self.locator = locator
+        self.empty_locator = empty_locator
+        self.settle = settle
+        self._state = None
+        self._since = None
+
+    def __call__(self, driver):
+        elements = driver.find_elements(*self.locator)
+        empty = not elements and self._says_empty(driver)
+        now = time.monotonic()
+        if (len(elements), empty) != self._state:
+            self._state, self._since = (len(elements), empty), now
+            return False
+        if now - self._since < self.settle:
+            return False
+        return elements or empty
+
+    def _says_empty(self, driver) -> bool:
+        """Whether the page shows its empty state marker, or a no-results message"""
+        if self.empty_locator and driver.find_elements(*self.empty_locator):
+            return True
+        try:
+            return bool(NO_RESULTS_PATTERN.search(driver.find_element(By.TAG_NAME, "body").text))
+        except WebDriverException:
+            return False
+
+class PageLatency:
+    """
+    Time each site takes for its results to become ready, used to size the readiness waits
+    The timeout is a multiple of the site's 95th percentile, with a default until enough pages were seen
+    Waits that time out are recorded at their full length, so the timeout grows again when a site slows down
+    """
+    def __init__(self, samples: int = 100, min_samples: int = 5, default: float = 10.0,
+                 floor: float = 3.0, ceiling: float = 30.0, factor: float = 2.0):
+        self.samples = samples
+        self.min_samples = min_samples
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.factor = factor
+        self._latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, site: str, seconds: float):
+        """Record how long a page of a site took to become ready"""
+        with self._lock:
+            self._latencies.setdefault(site, deque(maxlen=self.samples)).append(seconds)
+
+    def percentile(self, site: str, q: float) -> Optional[float]:
+        """Get a latency percentile of a site, None before any page was recorded"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(site, ()))
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q / 100 * len(latencies)))]
+
+    def timeout(self, site: str) -> float:
+        """Get how long to wait for a page of a site before giving up on it"""
+        with self._lock:
+            seen = len(self._latencies.get(site, ()))
+        if seen < self.min_samples:
+            return self.default
+        return min(self.ceiling, max(self.floor, self.factor * self.percentile(site, 95)))
+
+page_latency = PageLatency()
+
+_shared_pool: Optional[DriverPool] = None
+_shared_pool_lock = threading.Lock()
+
+def shared_driver_pool() -> DriverPool:
+    """Get the process-wide driver pool, started on first use"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = DriverPool()
+        return _shared_pool
+
+def warm_shared_driver_pool():
+    """
+    Start the process-wide driver pool and its DRIVER_POOL_WARM browsers ahead of the first scrape
+    A browser that fails to start is only logged, the pool is then started on first use
+    """
+    try:
+        shared_driver_pool()
+    except Exception as e:
+        print(f"Could not warm the driver pool: {e}")
+
+def close_shared_driver_pool():
+    """Quit the browsers of the process-wide driver pool"""
+    global _shared_pool
+    with _shared_pool_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool is not None:
+        pool.close()
 
 class BaseScraper(ABC):
-    def __init__(self):
-        self.driver = None
+    # Class of the listing cards on a search results page
+    listing_class: str = None
+    # Query parameter selecting a page of search results
+    page_param: str = "page"
+    # Element a results page shows when the search found nothing, the page text is checked otherwise
+    empty_selector: str = None
+    # Result page fetches in flight per site, shared by every scrape of the process
+    _site_slots: Dict[type, threading.BoundedSemaphore] = {}
+    _site_slots_lock = threading.Lock()
+
+    def __init__(self, pool: DriverPool = None):
+        self.pool = pool
         self.max_retries = 3
         self.retry_delay = 2
         self.page_load_timeout = 30
-        self._initialize_driver()
+        self.http_timeout = 10
+        # Try a plain HTTP fetch of the server-rendered page before starting a browser
+        self.http_first = os.getenv("SCRAPER_HTTP_FIRST", "1") == "1"
+        # Result pages crawled per search, and how many pages of this site the process fetches at once
+        self.max_pages = int(os.getenv("SCRAPER_MAX_PAGES", "10"))
+        self.concurrency = int(os.getenv("SCRAPER_CONCURRENCY", "4"))
+        # Each thread scraping with this instance holds its own leased browser
+        self._local = threading.local()
+
+    @property
+    def driver(self) -> Optional[webdriver.Chrome]:
+        """Browser leased by the current thread's scrape"""
+        pooled = getattr(self._local, 'pooled', None)
+        return pooled.driver if pooled else None
+
+    def scrape(self, search_criteria: Dict) -> List[Dict]:
+        """
+        Scrape every result page of a search, the first one alone and the rest concurrently
         
-    def _initialize_driver(self):
-        """Initialize the Chrome WebDriver with appropriate options"""
-        try:
-            # Configure Chrome options
-            chrome_options = Options()
-            chrome_options.add_argument("--headless=new")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--window-size=1920,1080")
-            chrome_options.add_argument("--disable-notifications")
-            chrome_options.add_argument("--disable-extensions")
-            chrome_options.add_argument("--disable-infobars")
-            chrome_options.add_argument("--disable-popup-blocking")
-            chrome_options.add_argument("--ignore-certificate-errors")
-            
-            # Add performance logging preferences
-            chrome_options.set_capability(
-                "goog:loggingPrefs",
-                {"performance": "ALL", "browser": "ALL"}
-            )
-            
-            # Set Chrome binary location
-            chrome_binary = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
-            if os.path.exists(chrome_binary):
-                chrome_options.binary_location = chrome_binary
-            
-            # Create Service with specific chromedriver path
-            chromedriver_path = "/opt/homebrew/bin/chromedriver"
-            if not os.path.exists(chromedriver_path):
-                raise Exception(f"ChromeDriver not found at {chromedriver_path}")
-            
-            service = Service(executable_path=chromedriver_path)
-            
-            # Initialize Chrome WebDriver with the configured options
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.driver.set_page_load_timeout(self.page_load_timeout)
-            self.driver.implicitly_wait(10)
+        Args:
+            search_criteria: Dictionary containing search parameters
             
-            print("WebDriver initialized successfully")
-                
-        except Exception as e:
-            print(f"Error initializing WebDriver: {e}")
-            if self.driver:
+        Returns:
+            List of dictionaries containing property listings
+        """
+        listings, page_count = self._scrape_page(search_criteria, 1)
+        pages = range(2, min(page_count, self.max_pages) + 1)
+
+        def scrape_page(page: int) -> List[Dict]:
+            try:
+                return self._scrape_page(search_criteria, page)[0]
+            except Exception as e:
+                print(f"Error scraping result page {page}: {e}")
+                return []
+
+        if pages:
+            print(f"Crawling {len(pages)} more result pages with {type(self).__name__}")
+            # Fetches wait for one of the site's slots, browser ones also for a driver from the pool
+            with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(pages)))) as executor:
+                for page_listings in executor.map(scrape_page, pages):
+                    listings.extend(page_listings)
+
+        # Listings move between pages when new ones are published during the crawl
+        unique = {}
+        for listing in listings:
+            unique.setdefault(listing.get('link') or id(listing), listing)
+        return list(unique.values())
+
+    def _scrape_page(self, search_criteria: Dict, page: int) -> Tuple[List[Dict], int]:
+        """
+        Scrape one result page over plain HTTP, or on a browser leased from the pool when that finds none
+        Returns the matching listings and the number of result pages the page reports
+        """
+        with self._slots():
+            self._local.page_count = 1
+            if self.http_first and self.listing_class:
+                listings = self._scrape_http(search_criteria, page)
+                if listings is not None:
+                    return listings, self._local.page_count
+
+            pool = self.pool or shared_driver_pool()
+            with pool.lease() as pooled:
+                self._local.pooled = pooled
                 try:
-                    self.driver.quit()
-                except:
-                    pass
-                self.driver = None
-            raise
-        
+                    return self._scrape(search_criteria, page), self._local.page_count
+                finally:
+                    self._local.pooled = None
+
+    def _slots(self) -> threading.BoundedSemaphore:
+        """Semaphore capping this site's concurrent page fetches across every scrape of the process"""
+        with BaseScraper._site_slots_lock:
+            site = type(self)
+            if site not in BaseScraper._site_slots:
+                BaseScraper._site_slots[site] = threading.BoundedSemaphore(self.concurrency)
+            return BaseScraper._site_slots[site]
+
+    def _page_url(self, criteria: Dict, page: int) -> str:
+        """Build the URL of a page of search results, the first page being the plain search URL"""
+        url = self._build_search_url(criteria)
+        if page <= 1:
+            return url
+        return f"{url}{'&' if '?' in url else '?'}{self.page_param}={page}"
+
+    def _page_count(self, page: HtmlElement, card_count: int) -> int:
+        """
+        Number of result pages a results page reports
+        Taken from the highest page linked in its pagination, or from the result count divided by the cards shown
+        """
+        count = 1
+        for link in page.tag.select("a[href]"):
+            for value in parse_qs(urlparse(link["href"]).query).get(self.page_param, ()):
+                if value.isdigit():
+                    count = max(count, int(value))
+
+        match = RESULT_COUNT_PATTERN.search(page.text)
+        if match and card_count:
+            total = int(re.sub(r"\D", "", match.group(1)))
+            count = max(count, math.ceil(total / card_count))
+        return count
+
+    def _scrape_http(self, search_criteria: Dict, page: int = 1) -> Optional[List[Dict]]:
+        """
+        Fetch a search page without a browser and parse its server-rendered listing cards
+        Returns None when the page could not be fetched or none of its cards parse, e.g. when it is rendered client-side
+        """
+        url = self._page_url(search_criteria, page)
+        try:
+            response = http_session().get(url, timeout=self.http_timeout)
+        except requests.RequestException as e:
+            print(f"HTTP fetch of {url} failed: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"HTTP fetch of {url} returned {response.status_code}")
+            return None
+
+        items = self._listing_cards(response.text, response.url)
+        if not items:
+            return None
+        print(f"Found {len(items)} listings over HTTP at {url}")
+
+        listings = []
+        parsed = False
+        for item in items:
+            try:
+                listing = self._parse_listing(item)
+                if listing:
+                    parsed = True
+                    if self._matches_criteria(listing, search_criteria):
+                        listings.append(listing)
+            except Exception as e:
+                print(f"Error parsing listing: {e}")
+        # Placeholder cards filled in client-side parse into nothing, the browser has to render them
+        return listings if parsed else None
+
+    def _listing_cards(self, html: str = None, url: str = None) -> List[HtmlElement]:
+        """
+        Parse the listing cards of a results page, by default the page loaded in the leased browser
+        The browser's DOM is read in a single round-trip, fields are then extracted locally
+        The number of result pages it reports is kept for the current thread's scrape
+        """
+        if html is None:
+            html, url = self.driver.page_source, self.driver.current_url
+        page = HtmlElement(BeautifulSoup(html, HTML_PARSER), url)
+        cards = page.find_elements(By.CLASS_NAME, self.listing_class)
+        self._local.page_count = self._page_count(page, len(cards))
+        return cards
+
     def _safe_get(self, url: str, wait_selector: str = None) -> bool:
         """
         Safely navigate to a URL with retries and explicit waits
         
         Args:
             url: The URL to navigate to
-            wait_selector: CSS selector to wait for after page load
+            wait_selector: CSS selector of the listing cards, waited for until their count is stable
+                or the page says there are none
             
         Returns:
             bool: True if navigation was successful, False otherwise
         """
+        site = type(self).__name__
         retry_count = 0
         while retry_count < self.max_retries:
             try:
@@ -91,22 +582,29 @@ class BaseScraper(ABC):
                 
                 # Navigate to URL
                 print(f"Navigating to {url}")
+                started = time.monotonic()
                 self.driver.get(url)
+                self._local.pooled.page_loads += 1
                 
-                # Wait for specific element if selector provided
+                # Wait for the cards to stop changing, as long as this site usually takes
+                # A page saying the search found nothing is ready too, and is neither retried nor a timeout
                 if wait_selector:
-                    WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located(("css selector", wait_selector))
+                    empty_locator = (By.CSS_SELECTOR, self.empty_selector) if self.empty_selector else None
+                    WebDriverWait(self.driver, page_latency.timeout(site), poll_frequency=0.2).until(
+                        ResultsStable((By.CSS_SELECTOR, wait_selector), empty_locator)
                     )
+                    page_latency.record(site, time.monotonic() - started)
                     
                 return True
                 
             except TimeoutException:
+                # The wait already took its time, retry at once
                 print(f"Timeout loading {url}")
+                if wait_selector:
+                    page_latency.record(site, time.monotonic() - started)
                 retry_count += 1
                 if retry_count < self.max_retries:
                     print(f"Retrying ({retry_count + 1}/{self.max_retries})...")
-                    time.sleep(self.retry_delay)
                     continue
                 return False
                 
@@ -125,13 +623,40 @@ class BaseScraper(ABC):
                 
         return False
         
+    def _matches_location(self, listing_location: str, criteria_location: str) -> bool:
+        """Check if a listing location is in the searched locality"""
+        wanted = locality_index.resolve(criteria_location)
+        if wanted:
+            return bool(wanted & locality_index.resolve(listing_location))
+
+        # Unknown places fall back to requiring every search term
+        location_terms = criteria_location.lower().split()
+        listing_location = listing_location.lower()
+        return all(term in listing_location for term in location_terms)
+
     @abstractmethod
-    def scrape(self, search_criteria: Dict) -> List[Dict]:
+    def _build_search_url(self, criteria: Dict) -> str:
+        """Build the URL of the search results page for the criteria"""
+        pass
+
+    @abstractmethod
+    def _parse_listing(self, item) -> Optional[Dict]:
+        """Extract a listing from a listing card, a WebElement or an HtmlElement"""
+        pass
+
+    @abstractmethod
+    def _matches_criteria(self, listing: Dict, criteria: Dict) -> bool:
+        """Check if a listing matches the search criteria"""
+        pass
+
+    @abstractmethod
+    def _scrape(self, search_criteria: Dict, page: int = 1) -> List[Dict]:
         """
-        Abstract method to be implemented by each website scraper
+        Abstract method to be implemented by each website scraper, self.driver is leased while it runs
         
         Args:
             search_criteria: Dictionary containing search parameters
+            page: Result page to scrape, see _page_url
             
         Returns:
             List of dictionaries containing property listings
@@ -139,16 +664,5 @@ class BaseScraper(ABC):
         pass
 
     def cleanup(self):
-        """Close the browser session"""
-        try:
-            if self.driver:
-                print("Cleaning up WebDriver resources")
-                self.driver.quit()
-        except Exception as e:
-            print(f"Error during cleanup: {e}")
-        finally:
-            self.driver = None
-            
-    def __del__(self):
-        """Ensure driver is closed when object is destroyed"""
-        self.cleanup()
\ No newline at end of file
+        """Browsers are returned to the pool after every scrape, see close_shared_driver_pool"""
+        pass
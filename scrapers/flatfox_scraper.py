@@ -1,46 +1,35 @@
 from typing import Dict, List
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException
 from datetime import datetime
-import time
 import re
-from .base_scraper import BaseScraper
+from .base_scraper import BaseScraper, DriverPool
+from features import FEATURE_MAPPING, encode_features
 
 class FlatfoxScraper(BaseScraper):
-    def __init__(self):
-        super().__init__()
+    listing_class = "ListingItem"
+
+    def __init__(self, pool: DriverPool = None):
+        super().__init__(pool)
         self.base_url = "https://flatfox.ch/fr/search/"
 
-    def scrape(self, search_criteria: Dict) -> List[Dict]:
+    def _scrape(self, search_criteria: Dict, page: int = 1) -> List[Dict]:
         """
         Scrape Flatfox listings based on search criteria
         """
         listings = []
         
         try:
-            url = self._build_search_url(search_criteria)
+            url = self._page_url(search_criteria, page)
             print(f"Scraping Flatfox with URL: {url}")
             
+            # Returns once the listing cards have stopped changing
             if not self._safe_get(url, ".ListingItem"):
-                print("Failed to navigate to Flatfox search page")
-                return []
-            
-            # Wait for listings to load and become interactive
-            try:
-                WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_all_elements_located((By.CLASS_NAME, "ListingItem"))
-                )
-            except TimeoutException:
-                print("No listings found on page")
+                print("No listings found on Flatfox search page")
                 return []
             
-            # Let the page fully load
-            time.sleep(2)
-            
-            # Get all listing items
-            listing_items = self.driver.find_elements(By.CLASS_NAME, "ListingItem")
+            # Get all listing items from one read of the rendered page, not a WebDriver call per field
+            listing_items = self._listing_cards()
             print(f"Found {len(listing_items)} listings")
             
             for item in listing_items:
@@ -103,19 +92,9 @@ class FlatfoxScraper(BaseScraper):
             features = []
             feature_elements = item.find_elements(By.CSS_SELECTOR, "[data-cy='listing-characteristics'] span")
             
-            feature_mapping = {
-                'balcon': 'balcony',
-                'ascenseur': 'elevator',
-                'parking': 'parking',
-                'garage': 'parking',
-                'terrasse': 'terrace',
-                'jardin': 'garden',
-                'meublé': 'furnished'
-            }
-            
             for elem in feature_elements:
                 feature_text = elem.text.lower()
-                for fr, en in feature_mapping.items():
+                for fr, en in FEATURE_MAPPING.items():
                     if fr in feature_text:
                         features.append(en)
                         break
@@ -127,6 +106,7 @@ class FlatfoxScraper(BaseScraper):
                 "rooms": rooms,
                 "size": size,
                 "features": features,
+                "feature_mask": encode_features(features),
                 "link": link,
                 "source": "Flatfox",
                 "created_at": datetime.now()
@@ -158,9 +138,7 @@ class FlatfoxScraper(BaseScraper):
             
         # Location check
         if criteria.get('location'):
-            location_terms = criteria['location'].lower().split()
-            listing_location = listing['location'].lower()
-            if not all(term in listing_location for term in location_terms):
+            if not self._matches_location(listing['location'], criteria['location']):
                 return False
                 
         # Features check
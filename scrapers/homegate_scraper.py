@@ -1,37 +1,33 @@
 from typing import Dict, List
-from .base_scraper import BaseScraper
+from .base_scraper import BaseScraper, DriverPool
+from features import FEATURE_MAPPING, encode_features
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
-import time
 import re
 
 class HomegateScraper(BaseScraper):
-    def __init__(self):
-        super().__init__()
+    listing_class = "ListingItem"
+    page_param = "ep"
+
+    def __init__(self, pool: DriverPool = None):
+        super().__init__(pool)
         self.base_url = "https://www.homegate.ch/louer/"
 
-    def scrape(self, search_criteria: Dict) -> List[Dict]:
+    def _scrape(self, search_criteria: Dict, page: int = 1) -> List[Dict]:
         """
         Scrape Homegate listings based on search criteria
         """
         listings = []
         
         try:
-            url = self._build_search_url(search_criteria)
-            self.driver.get(url)
-            
-            # Wait for listings to load
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "ListingItem"))
-            )
-            
-            # Let the page fully load
-            time.sleep(2)
+            url = self._page_url(search_criteria, page)
+            # Returns once the listing cards have stopped changing
+            if not self._safe_get(url, ".ListingItem"):
+                print("No listings found on Homegate search page")
+                return []
             
-            # Get all listing items
-            listing_items = self.driver.find_elements(By.CLASS_NAME, "ListingItem")
+            # Get all listing items from one read of the rendered page, not a WebDriver call per field
+            listing_items = self._listing_cards()
             
             for item in listing_items:
                 try:
@@ -86,19 +82,9 @@ class HomegateScraper(BaseScraper):
             features = []
             feature_elements = item.find_elements(By.CSS_SELECTOR, ".ListingItem__tags span")
             
-            feature_mapping = {
-                'balcon': 'balcony',
-                'ascenseur': 'elevator',
-                'parking': 'parking',
-                'garage': 'parking',
-                'terrasse': 'terrace',
-                'jardin': 'garden',
-                'meublé': 'furnished'
-            }
-            
             for elem in feature_elements:
                 feature_text = elem.text.lower()
-                for fr, en in feature_mapping.items():
+                for fr, en in FEATURE_MAPPING.items():
                     if fr in feature_text:
                         features.append(en)
                         break
@@ -110,6 +96,7 @@ class HomegateScraper(BaseScraper):
                 "rooms": rooms,
                 "size": size,
                 "features": features,
+                "feature_mask": encode_features(features),
                 "link": link,
                 "source": "Homegate",
                 "created_at": datetime.now()
@@ -142,9 +129,7 @@ class HomegateScraper(BaseScraper):
             
         # Location check
         if criteria.get('location'):
-            location_terms = criteria['location'].lower().split()
-            listing_location = listing['location'].lower()
-            if not all(term in listing_location for term in location_terms):
+            if not self._matches_location(listing['location'], criteria['location']):
                 return False
                 
         # Features check
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+import pytest
+from database import ConsumerCursor, Database, ListingChange, profile_cursor_name
+
+LISTING = {
+    'external_id': 'flatfox-1',
+    'source': 'flatfox',
+    'title': '3 pièces lumineux',
+    'price': 2000.0,
+    'location': '8004 Zürich',
+    'rooms': 3.0,
+    'size': 75.0,
+    'features': [],
+    'images': [],
+    'link': 'https://flatfox.ch/fr/flat/1/',
+}
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(f"sqlite:///{tmp_path / 'apartments.db'}")
+    yield db
+    db.session.remove()
+    db.engine.dispose()
+
+def test_deleting_a_profile_drops_its_cursor(db):
+    profile_id = db.add_search_profile('a@example.com', {'location': 'Zürich'}, 'hourly')
+    db.save_cursor(profile_cursor_name(profile_id), 1)
+    assert db.delete_profile(profile_id)
+    assert db.get_cursors([profile_cursor_name(profile_id)]) == {}
+
+def test_orphaned_cursors_do_not_hold_back_compaction(db):
+    scheduled = db.add_search_profile('a@example.com', {'location': 'Zürich'}, 'hourly')
+    unscheduled = db.add_search_profile('b@example.com', {'location': 'Zürich'}, 'daily')
+    db.add_listings([LISTING, dict(LISTING, external_id='flatfox-2', link='https://flatfox.ch/fr/flat/2/')])
+    head = db.get_changes(0)[-1].id
+    db.session.query(ListingChange).update({ListingChange.created_at: datetime.now() - timedelta(days=60)})
+    db.session.commit()
+
+    db.save_cursors({
+        profile_cursor_name(scheduled): head,
+        profile_cursor_name(unscheduled): 0,
+        profile_cursor_name(999): 0,  # deleted profile
+    })
+    db.update_profile(unscheduled, frequency='realtime')
+
+    db.archive_listings(timedelta(days=30))
+    assert db.get_changes(0) == []
+    assert [cursor.name for cursor in db.session.query(ConsumerCursor)] == [profile_cursor_name(scheduled)]
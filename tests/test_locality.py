@@ -0,0 +1,20 @@
+from locality import LocalityIndex
+
+index = LocalityIndex()
+
+def names(text):
+    return sorted(index.name(locality_id) for locality_id in index.resolve(text))
+
+def test_street_names_are_not_read_as_localities():
+    assert names('Rue de Genève 77, 1004 Lausanne') == ['1004', 'Lausanne']
+    assert names('Route de Berne 20, 1700 Fribourg') == ['1700', 'Fribourg']
+    assert names('Avenue de Morges 10, 1004 Lausanne') == ['1004', 'Lausanne']
+
+def test_postcode_search_stays_within_the_postcode():
+    wanted = index.resolve('8004')
+    assert wanted & index.resolve('Badenerstrasse 120, 8004 Zürich')
+    assert not wanted & index.resolve('Seefeldstrasse 5, 8008 Zürich')
+    assert index.resolve('Zürich') & index.resolve('Seefeldstrasse 5, 8008 Zürich')
+
+def test_names_resolve_without_a_postcode():
+    assert names('La Chaux-de-Fonds') == ['La Chaux-de-Fonds']
@@ -0,0 +1,9 @@
+import numpy as np
+from matcher import PropertyMatcher
+
+def test_percentages_round_like_the_builtin():
+    rng = np.random.default_rng(0)
+    # Random scores, and scores landing on a halfway point once converted to percent
+    raw_scores = np.concatenate([rng.random(10000), np.arange(10001) / 20000, np.arange(1000) / 1e6 + 0.000005])
+    expected = [round(score * 100, 2) for score in raw_scores.tolist()]
+    assert PropertyMatcher._to_percent(raw_scores).tolist() == expected
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+import pytest
+from database import SearchProfile
+from scheduler import MatchingScheduler
+
+CRITERIA = {'location': 'Zürich', 'min_price': 1000, 'max_price': 3000, 'min_rooms': 2, 'max_rooms': 4}
+
+LISTING = {
+    'external_id': 'flatfox-1',
+    'source': 'flatfox',
+    'title': '3 pièces lumineux',
+    'price': 2000.0,
+    'location': '8004 Zürich',
+    'rooms': 3.0,
+    'size': 75.0,
+    'features': [],
+    'images': [],
+    'link': 'https://flatfox.ch/fr/flat/1/',
+}
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def send_matches_notification(self, email, matches):
+        self.sent.append((email, [match.listing.link for match in matches]))
+
+@pytest.fixture(params=['1', '0'], ids=['listing-index', 'sql'])
+def scheduler(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'apartments.db'}")
+    monkeypatch.setenv('LISTING_INDEX', request.param)
+    scheduler = MatchingScheduler()
+    scheduler.notifier = RecordingNotifier()
+    yield scheduler
+    scheduler.db.session.remove()
+    scheduler.db.engine.dispose()
+
+def add_profile(db, email: str, last_notification: datetime) -> int:
+    profile_id = db.add_search_profile(email, CRITERIA, 'hourly')
+    db.session.get(SearchProfile, profile_id).last_notification = last_notification
+    db.session.commit()
+    return profile_id
+
+def test_profile_skipped_as_not_due_gets_the_changes_later(scheduler):
+    db = scheduler.db
+    now = datetime.now()
+    recent = add_profile(db, 'a@example.com', now - timedelta(minutes=59))
+    add_profile(db, 'b@example.com', now - timedelta(hours=2))
+    db.add_listings([LISTING])
+
+    # a was notified less than an hour ago, only b is due
+    scheduler.run_matching('hourly')
+    assert scheduler.notifier.sent == [('b@example.com', [LISTING['link']])]
+
+    # An hour later a is due and still hears about the listing, b already did
+    db.session.get(SearchProfile, recent).last_notification = now - timedelta(hours=1, minutes=1)
+    db.session.commit()
+    scheduler.run_matching('hourly')
+    assert scheduler.notifier.sent[1:] == [('a@example.com', [LISTING['link']])]
+
+def test_new_profile_gets_the_last_week_of_listings(scheduler):
+    db = scheduler.db
+    add_profile(db, 'a@example.com', datetime.now() - timedelta(hours=2))
+    db.add_listings([LISTING])
+    scheduler.run_matching('hourly')
+
+    # Created after the first run, the profile still starts a week back
+    db.add_search_profile('c@example.com', CRITERIA, 'hourly')
+    scheduler.run_matching('hourly')
+    assert scheduler.notifier.sent[1:] == [('c@example.com', [LISTING['link']])]
+
+def test_matches_are_not_sent_twice(scheduler):
+    db = scheduler.db
+    profile_id = add_profile(db, 'a@example.com', datetime.now() - timedelta(hours=2))
+    db.add_listings([LISTING])
+    scheduler.run_matching('hourly')
+
+    db.session.get(SearchProfile, profile_id).last_notification = datetime.now() - timedelta(hours=2)
+    db.session.commit()
+    scheduler.run_matching('hourly')
+    assert len(scheduler.notifier.sent) == 1
+
+def test_profiles_are_scored_against_the_changes_past_their_cursors(scheduler, monkeypatch):
+    db = scheduler.db
+    profile_id = add_profile(db, 'a@example.com', datetime.now() - timedelta(hours=2))
+    db.add_listings([LISTING])
+    scheduler.run_matching('hourly')
+
+    scored = []
+    match_profiles = scheduler.matcher.match_profiles
+    def recording_match_profiles(criteria, batch, **kwargs):
+        scored.append((len(criteria), len(batch)))
+        return match_profiles(criteria, batch, **kwargs)
+    monkeypatch.setattr(scheduler.matcher, 'match_profiles', recording_match_profiles)
+
+    other = dict(LISTING, external_id='flatfox-2', link='https://flatfox.ch/fr/flat/2/')
+    db.add_listings([other])
+    db.add_search_profile('c@example.com', CRITERIA, 'hourly')
+    db.session.get(SearchProfile, profile_id).last_notification = datetime.now() - timedelta(hours=2)
+    db.session.commit()
+    scheduler.run_matching('hourly')
+
+    # a only sees the listing added since its last run, the new profile c gets both on its own
+    assert scored == [(1, 1), (1, 2)]
+    assert scheduler.notifier.sent[1:] == [
+        ('a@example.com', [other['link']]),
+        ('c@example.com', [LISTING['link'], other['link']]),
+    ]
+
+def test_price_drop_on_an_old_listing_reaches_profiles(scheduler):
+    db = scheduler.db
+    profile_id = add_profile(db, 'a@example.com', datetime.now() - timedelta(hours=2))
+    db.add_listings([dict(LISTING, price=5000.0)])
+    scheduler.run_matching('hourly')
+    assert scheduler.notifier.sent == []
+
+    db.add_listings([LISTING])
+    db.session.get(SearchProfile, profile_id).last_notification = datetime.now() - timedelta(hours=2)
+    db.session.commit()
+    scheduler.run_matching('hourly')
+    assert scheduler.notifier.sent == [('a@example.com', [LISTING['link']])]
+
+def test_edits_and_price_increases_are_not_sent_again(scheduler):
+    db = scheduler.db
+    profile_id = add_profile(db, 'a@example.com', datetime.now() - timedelta(hours=2))
+    db.add_listings([LISTING])
+    scheduler.run_matching('hourly')
+
+    for edit in (dict(LISTING, title='3 pièces rénové'), dict(LISTING, title='3 pièces rénové', price=2200.0)):
+        db.add_listings([edit])
+        db.session.get(SearchProfile, profile_id).last_notification = datetime.now() - timedelta(hours=2)
+        db.session.commit()
+        scheduler.run_matching('hourly')
+    assert scheduler.notifier.sent == [('a@example.com', [LISTING['link']])]
+
+def test_listings_ingested_elsewhere_reach_realtime_profiles(scheduler):
+    db = scheduler.db
+    db.add_search_profile('r@example.com', CRITERIA, 'realtime')
+    scheduler.load_realtime_profiles()
+
+    # Ingested by the API's /search, not by the scheduler's scrapes
+    db.add_listings([LISTING])
+    db.add_listings([dict(LISTING, title='3 pièces rénové')])
+    scheduler.run_realtime()
+    scheduler.run_realtime()
+    assert scheduler.notifier.sent == [('r@example.com', [LISTING['link']])]